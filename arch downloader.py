@@ -2,7 +2,9 @@ import requests
 import sys
 import os
 import json
+import re
 import threading
+import queue
 import tkinter as tk
 from tkinter import filedialog, messagebox, ttk
 from tqdm import tqdm
@@ -11,8 +13,26 @@ import hashlib
 import argparse
 import shutil
 import math
+import random
 import webbrowser
 import logging
+import collections
+import contextlib
+import functools
+import tracemalloc
+import asyncio
+import socket
+import ssl
+import http.client
+import urllib.parse
+import http.server
+import tempfile
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, as_completed, TimeoutError as FuturesTimeout
+try:
+    import resource  # peak RSS for benchmarks; not available on Windows
+except ImportError:
+    resource = None
 
 # -----------------------
 # Logging + Config files
@@ -27,6 +47,17 @@ logging.basicConfig(
 
 # Persisted settings file
 CONFIG_FILE = "arch_downloader_config.json"
+# Per-mirror performance history (EWMA throughput/TTFB, failures, last seen)
+MIRROR_STATS_FILE = "arch_downloader_mirrors.json"
+# Cached copy of archlinux.org's mirror status JSON, plus its validators
+MIRROR_STATUS_URL = "https://archlinux.org/mirrors/status/json/"
+MIRROR_STATUS_CACHE = "arch_downloader_status.json"
+MIRROR_STATUS_META = "arch_downloader_status.meta.json"
+# seconds a cached status document is used without asking the server
+MIRROR_STATUS_TTL = 3600
+# Current ISO release (filename, version, SHA-256) read from a mirror's sha256sums.txt
+RELEASE_CACHE = "arch_downloader_release.json"
+RELEASE_TTL = 3600
 # history functionality removed
 
 # -----------------------
@@ -79,6 +110,7 @@ LANGUAGES = {
         "resume_supported": "Resume supported (server accepts Range).",
         "resume_not_supported": "Resume not supported by server; full re-download will occur.",
         "eta_label": "Speed: {speed:.2f} MB/s  ETA: {eta}",
+        "preparing": "Preparing download...",
     },
     "es": {
         "detecting_country": "Detectando tu país...",
@@ -125,6 +157,7 @@ LANGUAGES = {
         "resume_supported": "Reanudar soportado (el servidor acepta Range).",
         "resume_not_supported": "Reanudar no soportado por el servidor; se descargará completo.",
         "eta_label": "Velocidad: {speed:.2f} MB/s  ETA: {eta}",
+        "preparing": "Preparando la descarga...",
     },
     "ko": {  # Korean
         "detecting_country": "국가를 감지하는 중...",
@@ -171,6 +204,7 @@ LANGUAGES = {
         "resume_supported": "재개 가능 (서버가 Range를 허용함).",
         "resume_not_supported": "서버가 재개를 지원하지 않음; 전체 재다운로드가 발생합니다.",
         "eta_label": "속도: {speed:.2f} MB/s  ETA: {eta}",
+        "preparing": "다운로드 준비 중...",
     },
     "zh": {  # Mandarin (simplified)
         "detecting_country": "正在检测国家...",
@@ -217,6 +251,7 @@ LANGUAGES = {
         "resume_supported": "支持续传（服务器接受 Range）。",
         "resume_not_supported": "服务器不支持续传；将进行完整重下载。",
         "eta_label": "速度：{speed:.2f} MB/s  预计剩余：{eta}",
+        "preparing": "正在准备下载...",
     },
     "af": {  # Afrikaans
         "detecting_country": "Besig om jou land te vind...",
@@ -263,6 +298,7 @@ LANGUAGES = {
         "resume_supported": "Hervat ondersteun (bediener aanvaar Range).",
         "resume_not_supported": "Hervat nie ondersteun nie; volle her-aflaai sal plaasvind.",
         "eta_label": "Spoed: {speed:.2f} MB/s  ETA: {eta}",
+        "preparing": "Berei tans die aflaai voor...",
     },
     "de": {  # German
         "detecting_country": "Ermittle Ihr Land...",
@@ -309,6 +345,7 @@ LANGUAGES = {
         "resume_supported": "Fortsetzen unterstützt (Server erlaubt Range).",
         "resume_not_supported": "Fortsetzen nicht unterstützt; vollständiger Neu-Download erfolgt.",
         "eta_label": "Geschw.: {speed:.2f} MB/s  ETA: {eta}",
+        "preparing": "Download wird vorbereitet...",
     },
     "fr": {  # French
         "detecting_country": "Détection du pays...",
@@ -355,6 +392,7 @@ LANGUAGES = {
         "resume_supported": "Reprise prise en charge (le serveur accepte Range).",
         "resume_not_supported": "Reprise non prise en charge ; un nouveau téléchargement complet aura lieu.",
         "eta_label": "Vitesse : {speed:.2f} MB/s  ETA : {eta}",
+        "preparing": "Préparation du téléchargement...",
     },
     "ja": {  # Japanese
         "detecting_country": "国を検出しています...",
@@ -401,6 +439,7 @@ LANGUAGES = {
         "resume_supported": "再開がサポートされています (サーバーが Range を受け入れます)。",
         "resume_not_supported": "サーバーが再開をサポートしていません; フル再ダウンロードが発生します。",
         "eta_label": "速度: {speed:.2f} MB/s  残り: {eta}",
+        "preparing": "ダウンロードを準備しています...",
     },
 }
 
@@ -419,7 +458,9 @@ def load_config():
                 return json.load(f)
     except Exception as e:
         logging.exception("Failed loading config")
-    return {"last_folder": os.path.expanduser("~"), "lang": "en", "verify": True, "window": None}
+    return {"last_folder": os.path.expanduser("~"), "lang": "en", "verify": True, "window": None,
+            "connections": DEFAULT_CONNECTIONS, "swarm": DEFAULT_SWARM_MIRRORS, "engine": DEFAULT_ENGINE,
+            "metrics_file": METRICS_FILE, "prometheus_textfile": None}
 
 def save_config(cfg):
     """Save configuration to disk."""
@@ -430,102 +471,2184 @@ def save_config(cfg):
     except Exception:
         logging.exception("Failed saving config")
 
+# -----------------------
+# Shared HTTP session (keep-alive connection pools)
+# -----------------------
+# hosts kept in the pool manager (ranked mirrors plus archlinux.org and ipinfo.io)
+POOL_HOSTS = 32
+# keep-alive connections per host: enough for parallel probes or segmented downloads
+POOL_MAXSIZE = 16
+USER_AGENT = "Easy-Arch-Downloader"
+
+_session = None
+_session_lock = threading.Lock()
+
+def get_session():
+    """
+    The process-wide requests.Session. Every HTTP call goes through it so repeated
+    requests to a host (retries, Range segments, checksum and listing fetches) reuse
+    an open keep-alive connection instead of paying DNS, TCP and TLS setup again.
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(pool_connections=POOL_HOSTS, pool_maxsize=POOL_MAXSIZE)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            session.headers["User-Agent"] = USER_AGENT
+            _session = session
+        return _session
+
+def session_stats():
+    """
+    Connection reuse across the shared session: {"hosts", "connections", "requests",
+    "reused"}, where connections counts newly opened sockets and reused the requests
+    served over an already open one.
+    """
+    stats = {"hosts": 0, "connections": 0, "requests": 0, "reused": 0}
+    with _session_lock:
+        session = _session
+    if session is None:
+        return stats
+    seen = set()
+    for adapter in session.adapters.values():
+        if id(adapter) in seen:
+            continue
+        seen.add(id(adapter))
+        pools = adapter.poolmanager.pools
+        for key in list(pools.keys()):
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            stats["hosts"] += 1
+            stats["connections"] += pool.num_connections
+            stats["requests"] += pool.num_requests
+    stats["reused"] = max(0, stats["requests"] - stats["connections"])
+    return stats
+
+def log_session_stats():
+    stats = session_stats()
+    logging.info("HTTP session: %d requests over %d connections to %d hosts (%d reused)",
+                 stats["requests"], stats["connections"], stats["hosts"], stats["reused"])
+
+# -----------------------
+# Metrics (JSON lines + optional Prometheus textfile)
+# -----------------------
+# every probe and every download_iso run appends one JSON object to METRICS_FILE;
+# with a textfile path configured, this process's totals are also written in the
+# Prometheus text format (for node_exporter's textfile collector)
+METRICS_FILE = "arch_downloader_metrics.jsonl"
+# seconds between (elapsed, bytes) samples of a download's progress
+METRICS_SAMPLE_INTERVAL = 1.0
+
+_metrics_config = {"file": METRICS_FILE, "textfile": None}
+_metrics_lock = threading.Lock()
+# Prometheus series: {(metric name, ((label, value), ...)): value}
+_prom = {}
+
+def configure_metrics(cfg):
+    """Apply the metrics_file and prometheus_textfile config keys (None disables either)."""
+    _metrics_config["file"] = cfg.get("metrics_file", METRICS_FILE)
+    _metrics_config["textfile"] = cfg.get("prometheus_textfile")
+
+def write_metrics(record):
+    """Append one timestamped record to the JSON-lines metrics file."""
+    path = _metrics_config["file"]
+    if not path:
+        return
+    try:
+        line = json.dumps({"ts": round(time.time(), 3), **record}, separators=(",", ":"))
+        with _metrics_lock, open(path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+    except Exception:
+        logging.exception("Failed writing metrics")
+
+def _prom_set(name, value, add=False, **labels):
+    """Set (or with add=True, increase) one Prometheus series (lock held by the caller)."""
+    key = (name, tuple(sorted(labels.items())))
+    _prom[key] = (_prom.get(key, 0) if add else 0) + value
+
+def flush_prometheus():
+    """
+    Atomically rewrite the Prometheus textfile, if configured. Names ending in _total
+    are counters for this process; the rest are gauges holding the latest value.
+    """
+    path = _metrics_config["textfile"]
+    if not path:
+        return
+    with _metrics_lock:
+        series = sorted(_prom.items())
+    lines, typed = [], set()
+    for (name, labels), value in series:
+        if name not in typed:
+            typed.add(name)
+            lines.append(f"# TYPE {name} {'counter' if name.endswith('_total') else 'gauge'}")
+        text = ",".join('{}="{}"'.format(k, str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+                        for k, v in labels)
+        lines.append(f"{name}{{{text}}} {value}" if text else f"{name} {value}")
+    try:
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(path + ".tmp", path)
+    except Exception:
+        logging.exception("Failed writing Prometheus textfile %s", path)
+
+def record_probe_metrics(probe, engine=None):
+    """Write a probe's timings as a metrics record and update the probe gauges."""
+    fields = ("url", "ok", "dns", "tcp", "tls", "connect", "ttfb", "throughput", "bytes", "samples")
+    write_metrics({"type": "probe", "engine": engine, **{k: probe.get(k) for k in fields}})
+    if not probe.get("url"):
+        return
+    mirror = _mirror_key(probe["url"])
+    with _metrics_lock:
+        _prom_set("arch_downloader_probes_total", 1, add=True, mirror=mirror, ok=str(bool(probe.get("ok"))).lower())
+        if probe.get("ok"):
+            for phase in ("dns", "tcp", "tls", "ttfb"):
+                _prom_set("arch_downloader_probe_phase_seconds", probe.get(phase) or 0.0, mirror=mirror, phase=phase)
+            _prom_set("arch_downloader_probe_throughput_bytes", probe.get("throughput") or 0.0, mirror=mirror)
+
+def new_run_metrics(name, engine=None):
+    """
+    Collector for one download_iso run. The download paths add per-mirror bytes, time,
+    TTFB and errors (metrics_mirror) and failovers; download_iso adds progress samples
+    and phase times, and finish_run_metrics writes the record.
+    """
+    return {"type": "download", "name": name, "engine": engine, "mode": None, "started": time.time(),
+            "phases": {}, "samples": [], "mirrors": {}, "retries": 0, "failovers": []}
+
+def metrics_mirror(run, url, nbytes=0, seconds=0.0, ttfb=None, phases=None, error=False):
+    """Add to url's counters in run (thread-safe; no-op when run is None)."""
+    if run is None:
+        return
+    with _metrics_lock:
+        m = run["mirrors"].setdefault(_mirror_key(url), {"bytes": 0, "seconds": 0.0, "ttfb": None, "errors": 0})
+        m["bytes"] += nbytes
+        m["seconds"] += seconds
+        if ttfb is not None:
+            m["ttfb"] = ttfb
+        if phases:
+            m.update(phases)
+        if error:
+            m["errors"] += 1
+            run["retries"] += 1
+
+def metrics_failover(run, url):
+    """Note that (part of) the download moved to url."""
+    if run is None:
+        return
+    with _metrics_lock:
+        run["failovers"].append([round(time.time() - run["started"], 2), _mirror_key(url)])
+
+def metrics_sample(run, downloaded):
+    """Add an (elapsed seconds, bytes) sample, at most one per METRICS_SAMPLE_INTERVAL."""
+    now = time.time()
+    if run["samples"] and now - run["started"] - run["samples"][-1][0] < METRICS_SAMPLE_INTERVAL:
+        return
+    run["samples"].append([round(now - run["started"], 2), downloaded])
+
+def metrics_phase(run, phase, started):
+    """Add the time since `started` to a named phase of run."""
+    run["phases"][phase] = round(run["phases"].get(phase, 0.0) + time.time() - started, 3)
+
+def metrics_writer(run, w):
+    """Add a disk writer's totals (see new_writer) to run's "disk" counters."""
+    if run is None:
+        return
+    with _metrics_lock:
+        disk = run.setdefault("disk", {"bytes": 0, "writes": 0, "write_seconds": 0.0, "fsyncs": 0, "waited": 0.0})
+        for key in disk:
+            disk[key] = round(disk[key] + w[key], 3)
+
+def finish_run_metrics(run, ok, verified=None):
+    """Complete a run record, write it and update the Prometheus totals."""
+    run.update(ok=bool(ok), verified=verified, duration=round(time.time() - run["started"], 3),
+               bytes=sum(m["bytes"] for m in run["mirrors"].values()), session=session_stats())
+    write_metrics(run)
+    with _metrics_lock:
+        _prom_set("arch_downloader_downloads_total", 1, add=True, result="ok" if ok else "failed")
+        _prom_set("arch_downloader_download_duration_seconds", run["duration"])
+        _prom_set("arch_downloader_failovers_total", len(run["failovers"]), add=True)
+        for phase, seconds in run["phases"].items():
+            _prom_set("arch_downloader_download_phase_seconds", seconds, phase=phase)
+        for mirror, m in run["mirrors"].items():
+            _prom_set("arch_downloader_mirror_bytes_total", m["bytes"], add=True, mirror=mirror)
+            _prom_set("arch_downloader_mirror_seconds_total", m["seconds"], add=True, mirror=mirror)
+            _prom_set("arch_downloader_mirror_errors_total", m["errors"], add=True, mirror=mirror)
+    flush_prometheus()
+
+# -----------------------
+# Profiling (--profile)
+# -----------------------
+# with --profile, each phase (discovery, probing, download, verify, ui) records wall and
+# CPU time and a sampler thread records every thread's stack each PROFILE_INTERVAL;
+# the report is written at exit. When profiling is off a phase costs one None check.
+PROFILE_REPORT = "arch_downloader_profile.txt"
+PROFILE_INTERVAL = 0.005
+# frames kept per sampled stack, and entries listed per phase in the report
+PROFILE_DEPTH = 32
+PROFILE_TOP = 15
+
+_profiler = None
+_no_phase = contextlib.nullcontext()
+
+def start_profiling(path=PROFILE_REPORT, interval=PROFILE_INTERVAL):
+    """Start recording phase times and stack samples; stop_profiling() writes the report."""
+    global _profiler
+    prof = {"path": path, "interval": interval, "wall": time.perf_counter(), "cpu": time.process_time(),
+            "lock": threading.Lock(), "stop": threading.Event(), "phases": {}, "stacks": {},
+            "open": [], "by_thread": {}, "samples": 0}
+    prof["thread"] = threading.Thread(target=_profile_sampler, args=(prof,), name="profiler", daemon=True)
+    _profiler = prof
+    prof["thread"].start()
+
+@contextlib.contextmanager
+def _timed_phase(prof, name):
+    ident = threading.get_ident()
+    with prof["lock"]:
+        prof["by_thread"].setdefault(ident, []).append(name)
+        prof["open"].append(name)
+    wall, cpu, thread_cpu = time.perf_counter(), time.process_time(), time.thread_time()
+    try:
+        yield
+    finally:
+        wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+        thread_cpu = time.thread_time() - thread_cpu
+        with prof["lock"]:
+            stack = prof["by_thread"][ident]
+            stack.pop()
+            if not stack:
+                del prof["by_thread"][ident]
+            prof["open"].remove(name)
+            rec = prof["phases"].setdefault(name, {"calls": 0, "wall": 0.0, "cpu": 0.0, "thread_cpu": 0.0})
+            rec["calls"] += 1
+            rec["wall"] += wall
+            rec["cpu"] += cpu
+            rec["thread_cpu"] += thread_cpu
+
+def profile_phase(name):
+    """
+    Context manager marking a phase of the profile. Stack samples of the entering thread
+    count towards it; threads outside any phase count towards the outermost open one
+    (so probe and download workers belong to the phase that started them).
+    """
+    prof = _profiler
+    return _timed_phase(prof, name) if prof is not None else _no_phase
+
+def profiled(phase):
+    """Decorator running the whole function as profile_phase(phase)."""
+    def wrap(fn):
+        @functools.wraps(fn)
+        def inner(*args, **kwargs):
+            prof = _profiler
+            if prof is None:
+                return fn(*args, **kwargs)
+            with _timed_phase(prof, phase):
+                return fn(*args, **kwargs)
+        return inner
+    return wrap
+
+def _profile_sampler(prof):
+    """Sampler thread: count every other thread's current stack under its phase."""
+    own = threading.get_ident()
+    while not prof["stop"].wait(prof["interval"]):
+        names = {t.ident: t.name for t in threading.enumerate()}
+        frames = sys._current_frames()
+        with prof["lock"]:
+            outermost = prof["open"][0] if prof["open"] else "other"
+            for ident, frame in frames.items():
+                if ident == own:
+                    continue
+                stack = prof["by_thread"].get(ident)
+                calls = []
+                while frame is not None and len(calls) < PROFILE_DEPTH:
+                    code = frame.f_code
+                    calls.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                    frame = frame.f_back
+                calls.append(names.get(ident, str(ident)))
+                counts = prof["stacks"].setdefault(stack[-1] if stack else outermost, collections.Counter())
+                counts[tuple(reversed(calls))] += 1
+            prof["samples"] += 1
+        frames = frame = None  # do not keep the frames alive between samples
+
+def stop_profiling():
+    """
+    Stop the profiler and write its report: per-phase wall and CPU time, then the
+    hottest lines and stacks of each phase. All stacks are also written in folded
+    form (phase;thread;frame;... count) for flame graph tools, next to the report.
+    Returns the report path, or None when profiling was off.
+    """
+    global _profiler
+    prof, _profiler = _profiler, None
+    if prof is None:
+        return None
+    prof["stop"].set()
+    prof["thread"].join(1)
+    wall, cpu = time.perf_counter() - prof["wall"], time.process_time() - prof["cpu"]
+    lines = [f"Easy-Arch-Downloader profile, {time.strftime('%Y-%m-%d %H:%M:%S')}",
+             f"python {sys.version.split()[0]} on {sys.platform}; argv: {' '.join(sys.argv[1:])}",
+             f"wall {wall:.2f} s, process CPU {cpu:.2f} s, {prof['samples']} samples every "
+             f"{prof['interval'] * 1000:g} ms (every thread, running or waiting)", "",
+             f"{'phase':<12}{'calls':>8}{'wall s':>10}{'cpu s':>10}{'thread cpu s':>14}{'samples':>10}"]
+    for name, rec in sorted(prof["phases"].items(), key=lambda kv: -kv[1]["wall"]):
+        samples = sum(prof["stacks"].get(name, {}).values())
+        lines.append(f"{name:<12}{rec['calls']:>8}{rec['wall']:>10.3f}{rec['cpu']:>10.3f}"
+                     f"{rec['thread_cpu']:>14.3f}{samples:>10}")
+    lines.append("(cpu s is process CPU while the phase was open, all threads; thread cpu s is the entering thread's own)")
+    folded = []
+    for name, counts in sorted(prof["stacks"].items(), key=lambda kv: -sum(kv[1].values())):
+        total = sum(counts.values())
+        top = collections.Counter()
+        for stack, n in counts.items():
+            top[stack[-1]] += n
+            folded.append(f"{name};{';'.join(stack)} {n}")
+        lines += ["", f"[{name}] hottest lines ({total} samples)"]
+        lines += [f"  {n / total:6.1%}  {frame}" for frame, n in top.most_common(PROFILE_TOP)]
+        lines += ["", f"[{name}] hottest stacks (innermost 6 frames)"]
+        lines += [f"  {n / total:6.1%}  {stack[0]}: {' > '.join(stack[1:][-6:])}"
+                  for stack, n in counts.most_common(PROFILE_TOP)]
+    path = prof["path"]
+    try:
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+        with open(os.path.splitext(path)[0] + ".folded", "w", encoding="utf-8") as f:
+            f.write("\n".join(folded) + "\n")
+    except Exception:
+        logging.exception("Failed writing profile report %s", path)
+        return None
+    return path
+
+# -----------------------
+# Mirror performance history
+# -----------------------
+# history younger than this lets ranking skip the tiny probe rounds
+HISTORY_FRESH_SECONDS = 6 * 3600
+# failures stop counting against a mirror with this half-life
+FAILURE_HALF_LIFE = 3 * 24 * 3600
+# never-seen mirrors still probed when history is fresh, so new mirrors get a chance
+HISTORY_EXPLORE = 2
+
+_mirror_stats = None
+_mirror_stats_lock = threading.Lock()
+
+def _mirror_key(url):
+    """History key for a mirror base URL or an ISO URL on that mirror."""
+    idx = url.find("/iso/")
+    return (url[:idx] if idx >= 0 else url).rstrip("/")
+
+def load_mirror_stats():
+    """Return the per-mirror history dict, loading it from disk on first use."""
+    global _mirror_stats
+    with _mirror_stats_lock:
+        if _mirror_stats is None:
+            _mirror_stats = {}
+            try:
+                if os.path.exists(MIRROR_STATS_FILE):
+                    with open(MIRROR_STATS_FILE, "r", encoding="utf-8") as f:
+                        _mirror_stats = json.load(f)
+            except Exception:
+                logging.exception("Failed loading mirror history")
+        return _mirror_stats
+
+def save_mirror_stats():
+    """Write the per-mirror history to disk."""
+    stats = load_mirror_stats()
+    with _mirror_stats_lock:
+        try:
+            tmp = MIRROR_STATS_FILE + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(stats, f, indent=1)
+            os.replace(tmp, MIRROR_STATS_FILE)
+        except Exception:
+            logging.exception("Failed saving mirror history")
+
+def _decayed_failures(entry, now=None):
+    """Failure score of a history entry, halved every FAILURE_HALF_LIFE seconds."""
+    age = (now or time.time()) - entry.get("last_failure", 0)
+    return entry.get("fail_score", 0.0) * 0.5 ** (age / FAILURE_HALF_LIFE)
+
+def record_mirror_sample(url, throughput=None, ttfb=None, ok=True, weight=0.3):
+    """
+    Fold one observation (probe or real download) into a mirror's history.
+    throughput is bytes/s, ttfb seconds; weight is the EWMA factor for this sample.
+    """
+    stats = load_mirror_stats()
+    now = time.time()
+    with _mirror_stats_lock:
+        entry = stats.setdefault(_mirror_key(url), {})
+        entry["last_seen"] = now
+        if not ok:
+            entry["fail_score"] = _decayed_failures(entry, now) + 1.0
+            entry["last_failure"] = now
+            entry["failures"] = entry.get("failures", 0) + 1
+            return
+        entry["successes"] = entry.get("successes", 0) + 1
+        for field, value in (("throughput", throughput), ("ttfb", ttfb)):
+            if value:
+                old = entry.get(field)
+                entry[field] = value if old is None else old + weight * (value - old)
+
+def history_rate(url):
+    """EWMA throughput of url's mirror in bytes/s (0.0 when unknown)."""
+    entry = load_mirror_stats().get(_mirror_key(url))
+    return float(entry.get("throughput") or 0.0) if entry else 0.0
+
+def history_speed(url, size=None):
+    """
+    Effective MB/s predicted from history for the whole ISO, penalised by recent
+    failures; 0.0 for mirrors without throughput history.
+    """
+    entry = load_mirror_stats().get(_mirror_key(url))
+    if not entry or not entry.get("throughput"):
+        return 0.0
+    size = size or ISO_SIZE_ESTIMATE
+    predicted = entry.get("ttfb", 0.0) + size / entry["throughput"]
+    return size / predicted / (1 + _decayed_failures(entry)) / (1024 * 1024)
+
+def history_is_fresh(url, now=None):
+    """True when a mirror has a successful observation within HISTORY_FRESH_SECONDS."""
+    entry = load_mirror_stats().get(_mirror_key(url))
+    return bool(entry and entry.get("throughput")
+                and (now or time.time()) - entry.get("last_seen", 0) < HISTORY_FRESH_SECONDS)
+
+def forget_mirrors(prefix):
+    """Drop history entries of mirrors whose URL starts with prefix."""
+    stats = load_mirror_stats()
+    with _mirror_stats_lock:
+        for key in [k for k in stats if k.startswith(prefix.rstrip("/"))]:
+            del stats[key]
+    save_mirror_stats()
+
+def order_by_history(mirrors):
+    """Mirrors sorted by history_speed, best first (unknown mirrors keep their order at the end)."""
+    return sorted(mirrors, key=lambda m: history_speed(m.url), reverse=True)
+
 def get_country():
     """Detect country using external IP geolocation (ipinfo.io)."""
     try:
-        resp = requests.get("https://ipinfo.io/json", timeout=5)
+        resp = get_session().get("https://ipinfo.io/json", timeout=5)
         resp.raise_for_status()
         return resp.json().get("country")
     except Exception:
         logging.exception("get_country failed")
         return None
 
-def get_mirrors(country):
-    """Fetch mirror list from archlinux.org and filter by country and active status."""
-    url = "https://archlinux.org/mirrors/status/json/"
+def fetch_mirror_status(ttl=MIRROR_STATUS_TTL):
+    """
+    Make sure a copy of the mirror status JSON is on disk and return its path.
+    - a cached copy younger than ttl seconds is used as is (no request)
+    - an older copy is revalidated with ETag / If-Modified-Since (304 -> reuse)
+    - if the fetch fails, the stale cached copy is used
+    Returns None only when nothing could be fetched and nothing is cached.
+    """
+    meta = {}
     try:
-        resp = requests.get(url, timeout=10)
-        resp.raise_for_status()
-        mirrors = resp.json().get("urls", [])
-        return [m for m in mirrors if m.get("country_code") == country and m.get("active")]
+        if os.path.exists(MIRROR_STATUS_META):
+            with open(MIRROR_STATUS_META, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+    except Exception:
+        logging.exception("Failed loading mirror status metadata")
+    have = os.path.exists(MIRROR_STATUS_CACHE)
+    if have and time.time() - meta.get("fetched_at", 0) < ttl:
+        return MIRROR_STATUS_CACHE
+
+    headers = {}
+    if have and meta.get("etag"):
+        headers["If-None-Match"] = meta["etag"]
+    if have and meta.get("last_modified"):
+        headers["If-Modified-Since"] = meta["last_modified"]
+    try:
+        with get_session().get(MIRROR_STATUS_URL, headers=headers, timeout=10, stream=True) as resp:
+            if resp.status_code == 304 and have:
+                logging.info("Mirror status not modified; using cached copy")
+            else:
+                resp.raise_for_status()
+                tmp = MIRROR_STATUS_CACHE + ".tmp"
+                with open(tmp, "wb") as f:
+                    for chunk in resp.iter_content(chunk_size=65536):
+                        f.write(chunk)
+                os.replace(tmp, MIRROR_STATUS_CACHE)
+                meta = {"etag": resp.headers.get("ETag"), "last_modified": resp.headers.get("Last-Modified")}
+        meta["fetched_at"] = time.time()
+        with open(MIRROR_STATUS_META, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+    except Exception:
+        logging.exception("Fetching mirror status failed")
+        if have:
+            logging.warning("Using stale mirror status from %s", MIRROR_STATUS_CACHE)
+        else:
+            return None
+    return MIRROR_STATUS_CACHE
+
+# Compact mirror record: only the status fields the downloader uses
+# (country is the two-letter country_code)
+Mirror = collections.namedtuple("Mirror", ["url", "protocol", "country", "score", "delay", "completion_pct",
+                                           "duration_avg"])
+
+def iter_status_urls(fp, chunk_size=65536):
+    """
+    Yield the entries of the status document's "urls" array one at a time, reading
+    fp in chunks, so the whole document is never held as one big dict.
+    """
+    decoder = json.JSONDecoder()
+    buf, eof = "", False
+
+    def fill():
+        nonlocal buf, eof
+        data = fp.read(chunk_size)
+        eof = not data
+        buf += data
+
+    # skip ahead to the opening bracket of "urls"
+    while True:
+        idx = buf.find('"urls"')
+        start = buf.find("[", idx) if idx >= 0 else -1
+        if start >= 0:
+            buf, pos = buf[start + 1:], 0
+            break
+        if eof:
+            return
+        if idx < 0:
+            buf = buf[-8:]  # the key may straddle two chunks
+        fill()
+
+    while True:
+        while pos < len(buf) and buf[pos] in " \t\r\n,":
+            pos += 1
+        if pos >= len(buf):
+            if eof:
+                return
+            buf, pos = "", 0
+            fill()
+            continue
+        if buf[pos] == "]":
+            return
+        try:
+            obj, end = decoder.raw_decode(buf, pos)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            # entry cut off at the chunk boundary: read more and retry
+            buf, pos = buf[pos:], 0
+            fill()
+            continue
+        yield obj
+        pos = end
+        if pos > chunk_size:
+            buf, pos = buf[pos:], 0
+
+def parse_mirror_status(path, countries=None):
+    """
+    Stream the status document at path and return its active mirrors as Mirror records,
+    limited to the given set of country codes (None keeps every country).
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        return [
+            Mirror(e.get("url"), e.get("protocol"), e.get("country_code"), e.get("score"),
+                   e.get("delay"), e.get("completion_pct"), e.get("duration_avg"))
+            for e in iter_status_urls(f)
+            if e.get("active") and (countries is None or e.get("country_code") in countries)
+        ]
+
+# pre-ranking from the status document's own metrics: mirrors more than MAX_SYNC_DELAY
+# seconds behind or below MIN_COMPLETION of successful checks are dropped, and only
+# the best PRERANK_LIMIT go on to the network probe
+MAX_SYNC_DELAY = 24 * 3600
+MIN_COMPLETION = 0.95
+PRERANK_LIMIT = 10
+# below this many usable local mirrors, neighbouring countries are added
+MIN_LOCAL_MIRRORS = 5
+
+# Nearby countries to fall back on when the local mirror pool is thin
+NEIGHBOURS = {
+    "AT": ["DE", "CZ", "CH", "HU", "SI", "IT"], "AU": ["NZ", "SG", "ID"], "BE": ["NL", "FR", "DE", "LU"],
+    "BG": ["RO", "GR", "RS", "TR"], "BR": ["AR", "CL", "UY", "PY"], "CA": ["US"], "CH": ["DE", "FR", "AT", "IT"],
+    "CL": ["AR", "BR", "PE"], "CN": ["HK", "TW", "KR", "JP"], "CZ": ["DE", "AT", "SK", "PL"],
+    "DE": ["NL", "AT", "CH", "CZ", "PL", "DK", "FR"], "DK": ["DE", "SE", "NO"], "EE": ["LV", "FI", "LT"],
+    "ES": ["PT", "FR"], "FI": ["SE", "EE", "NO"], "FR": ["DE", "BE", "CH", "ES", "LU", "IT"],
+    "GB": ["IE", "NL", "FR", "BE"], "GR": ["BG", "CY", "IT"], "HK": ["CN", "TW", "SG"], "HR": ["SI", "HU", "RS", "AT"],
+    "HU": ["AT", "SK", "RO", "HR", "SI"], "ID": ["SG", "MY", "AU"], "IE": ["GB"], "IL": ["CY", "GR", "TR"],
+    "IN": ["SG", "BD", "LK"], "IT": ["CH", "AT", "FR", "SI"], "JP": ["KR", "TW", "HK"], "KR": ["JP", "TW", "HK"],
+    "KZ": ["RU", "KG"], "LT": ["LV", "PL", "EE"], "LU": ["DE", "FR", "BE"], "LV": ["LT", "EE"],
+    "MX": ["US", "CR"], "MY": ["SG", "TH", "ID"], "NL": ["DE", "BE", "GB", "LU"], "NO": ["SE", "DK", "FI"],
+    "NZ": ["AU"], "PL": ["DE", "CZ", "SK", "LT"], "PT": ["ES", "FR"], "RO": ["HU", "BG", "MD", "RS"],
+    "RS": ["HU", "RO", "BG", "HR"], "RU": ["FI", "EE", "LV", "KZ", "BY"], "SE": ["NO", "DK", "FI"],
+    "SG": ["MY", "ID", "TH", "HK"], "SI": ["AT", "HR", "IT", "HU"], "SK": ["CZ", "AT", "HU", "PL"],
+    "TH": ["MY", "SG", "VN"], "TR": ["BG", "GR"], "TW": ["HK", "JP", "KR"], "UA": ["PL", "SK", "HU", "RO", "MD"],
+    "US": ["CA", "MX"], "VN": ["TH", "SG", "HK"], "ZA": ["NA", "BW", "MZ", "KE"],
+}
+
+# protocols the downloader can fetch from; the status document lists each host once
+# per protocol (http, https, rsync)
+HTTP_PROTOCOLS = ("http", "https")
+
+def preferred_protocol(verify):
+    """
+    Protocol to use on hosts that offer both: plain HTTP when the ISO is checked against
+    sha256sums.txt, which is always fetched over HTTPS (see get_checksum_url), so the
+    bulk transfer skips TLS; HTTPS otherwise. download_iso still switches to HTTPS when
+    no checksum could be fetched.
+    """
+    return "http" if verify else "https"
+
+def https_url(url):
+    """url with http:// replaced by https:// (dropping an explicit :80); other URLs unchanged."""
+    parts = urllib.parse.urlsplit(url)
+    if parts.scheme != "http":
+        return url
+    netloc = parts.netloc[:-len(":80")] if parts.port == 80 else parts.netloc
+    return urllib.parse.urlunsplit(("https", netloc, parts.path, parts.query, parts.fragment))
+
+def dedupe_mirrors(mirrors, prefer="https"):
+    """
+    Keep one Mirror per host (and explicit port): rsync entries are dropped and, where
+    a host is listed over both http and https, the prefer entry wins. First-seen host
+    order is kept.
+    """
+    by_host = {}
+    for m in mirrors:
+        if m.protocol not in HTTP_PROTOCOLS:
+            continue
+        parts = urllib.parse.urlsplit(m.url)
+        host = (parts.hostname, parts.port)
+        if host not in by_host or (m.protocol == prefer and by_host[host].protocol != prefer):
+            by_host[host] = m
+    return list(by_host.values())
+
+def prerank_mirrors(mirrors, country=None, limit=PRERANK_LIMIT, prefer="https"):
+    """
+    Drop stale or incomplete mirrors using the status metrics, keep one entry per host
+    (see dedupe_mirrors) and rank the rest by the archlinux.org score (lower is better),
+    local mirrors before neighbouring ones.
+    Returns at most limit mirrors.
+    """
+    usable = dedupe_mirrors([
+        m for m in mirrors
+        if m.delay is not None and m.delay <= MAX_SYNC_DELAY
+        and m.completion_pct is not None and m.completion_pct >= MIN_COMPLETION
+    ], prefer)
+    usable.sort(key=lambda m: (m.country != country, m.score if m.score is not None else float("inf"),
+                               m.duration_avg or 0.0))
+    return usable[:limit]
+
+def get_mirrors(country, limit=PRERANK_LIMIT, prefer="https"):
+    """
+    Load the (cached) mirror list from archlinux.org and return the best candidates
+    for country as Mirror records, one per host over http(s) (prefer picks the protocol,
+    see preferred_protocol), pre-ranked by the status metrics. When the local pool is
+    thin, mirrors from neighbouring countries (and, failing that, the best mirrors
+    anywhere) are added.
+    """
+    path = fetch_mirror_status()
+    if not path:
+        return []
+    try:
+        nearby = {country} | set(NEIGHBOURS.get(country, []))
+        mirrors = parse_mirror_status(path, nearby)
+        local = prerank_mirrors([m for m in mirrors if m.country == country], country, limit, prefer)
+        if len(local) >= MIN_LOCAL_MIRRORS:
+            return local
+        ranked = prerank_mirrors(mirrors, country, limit, prefer)
+        if len(ranked) < MIN_LOCAL_MIRRORS:
+            ranked = prerank_mirrors(parse_mirror_status(path), country, limit, prefer)
+        logging.info("Thin local mirror pool for %s (%d usable); widened to %d candidates", country, len(local), len(ranked))
+        return ranked
     except Exception:
         logging.exception("get_mirrors failed")
         return []
 
-def test_mirror_speed(mirror_url, timeout=5):
-    """
-    Quick responsiveness + throughput estimation:
-    - Request the /iso/latest/ page and read a small chunk to estimate responsiveness.
-    - Returns estimated MB/s (may be coarse but useful for ranking).
-    """
-    test_url = mirror_url.rstrip("/") + "/iso/latest/"
-    try:
-        start = time.time()
-        resp = requests.get(test_url, stream=True, timeout=timeout)
-        resp.raise_for_status()
-        chunk = resp.raw.read(16384)  # read up to 16 KB
-        elapsed = time.time() - start
-        size = len(chunk) or 10240
-        speed = (size / (1024 * 1024)) / (elapsed if elapsed > 0 else 1)
-        return speed
-    except Exception:
-        return 0.0
+# "threads" (thread pool + blocking sockets) or "asyncio" (see the asyncio engine section)
+ENGINES = ("threads", "asyncio")
+DEFAULT_ENGINE = "threads"
+# probe sizing: bytes of the real ISO fetched per probe, and the size used by the
+# ranking model until a probe has reported the actual ISO size
+PROBE_BYTES = 1024 * 1024
+ISO_SIZE_ESTIMATE = 1200 * 1024 * 1024
+
+def _open_probe_connection(url, timeout):
+    """
+    Open an HTTP(S) connection to url's host, timing each setup phase.
+    Returns (connection, {"dns", "tcp", "tls"}) with times in seconds.
+    """
+    parts = urllib.parse.urlsplit(url)
+    if parts.scheme not in ("http", "https"):
+        raise ValueError(f"cannot probe {parts.scheme} mirror over HTTP")
+    https = parts.scheme == "https"
+    host, port = parts.hostname, parts.port or (443 if https else 80)
+    t0 = time.perf_counter()
+    addr = socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)[0][4]
+    t1 = time.perf_counter()
+    sock = socket.create_connection(addr[:2], timeout=timeout)
+    t2 = time.perf_counter()
+    if https:
+        sock = ssl.create_default_context().wrap_socket(sock, server_hostname=host)
+    t3 = time.perf_counter()
+    conn_cls = http.client.HTTPSConnection if https else http.client.HTTPConnection
+    conn = conn_cls(host, port, timeout=timeout)
+    conn.sock = sock
+    return conn, {"dns": t1 - t0, "tcp": t2 - t1, "tls": t3 - t2}
+
+def probe_mirror(mirror_url, iso_filename, probe_bytes=PROBE_BYTES, timeout=5):
+    """
+    Fetch the first probe_bytes of the real ISO from a mirror and measure separately:
+    - connect: DNS + TCP + TLS setup time (breakdown in dns/tcp/tls)
+    - ttfb: time from sending the request to the response headers
+    - throughput: sustained bytes/s after the first body chunk
+    Returns a dict with those keys plus url, bytes, total (ISO size), ok and samples
+    (throughput of successive windows of the probe, for confidence intervals).
+    """
+    result = {"url": mirror_url, "ok": False, "dns": 0.0, "tcp": 0.0, "tls": 0.0, "connect": 0.0,
+              "ttfb": 0.0, "throughput": 0.0, "samples": [], "bytes": 0, "total": 0}
+    url = mirror_iso_url(mirror_url, iso_filename)
+    conn = None
+    try:
+        for _redirect in range(3):
+            conn, phases = _open_probe_connection(url, timeout)
+            result.update(phases)
+            result["connect"] = sum(phases.values())
+            parts = urllib.parse.urlsplit(url)
+            sent = time.perf_counter()
+            conn.request("GET", parts.path or "/", headers={"Range": f"bytes=0-{probe_bytes - 1}",
+                                                          "User-Agent": USER_AGENT})
+            resp = conn.getresponse()
+            result["ttfb"] = time.perf_counter() - sent
+            if resp.status in (301, 302, 303, 307, 308) and resp.getheader("Location"):
+                url = urllib.parse.urljoin(url, resp.getheader("Location"))
+                conn.close()
+                continue
+            break
+        if resp.status not in (200, 206):
+            raise IOError(f"HTTP {resp.status}")
+        content_range = resp.getheader("Content-Range")
+        if content_range:
+            result["total"] = int(content_range.split("/")[-1])
+        else:
+            result["total"] = int(resp.getheader("Content-Length") or 0)
+        received = 0
+        marks = []  # (time, bytes received) after each read, for throughput samples
+        # small probes use small reads so even a 64 KB probe yields several timing points
+        read_size = min(65536, max(4096, probe_bytes // 16))
+        while received < probe_bytes:
+            chunk = resp.read(min(read_size, probe_bytes - received))
+            if not chunk:
+                break
+            received += len(chunk)
+            marks.append((time.perf_counter(), received))
+        _finish_probe(result, marks, read_size)
+        if result["ok"]:
+            mirror_succeeded(mirror_url)  # a working mirror gets its breaker closed
+    except Exception as e:
+        logging.debug("probe of %s failed: %s", mirror_url, e)
+    finally:
+        if conn:
+            conn.close()
+    return result
+
+def _finish_probe(result, marks, read_size):
+    """
+    Fill throughput, samples, bytes and ok of a probe result from its read marks
+    [(time, bytes received so far), ...]; the first read is excluded from throughput.
+    """
+    if not marks:
+        return result
+    first_at, first_len = marks[0]
+    last_at, received = marks[-1]
+    elapsed = last_at - first_at
+    # split the sustained part into up to 8 windows; each window's rate is one sample
+    window = max(read_size, (received - first_len) // 8)
+    last_t, last_b = first_at, first_len
+    for t, b in marks[1:]:
+        if b - last_b >= window and t > last_t:
+            result["samples"].append((b - last_b) / (t - last_t))
+            last_t, last_b = t, b
+    if received > first_len and elapsed > 0:
+        result["throughput"] = (received - first_len) / elapsed
+    elif received:
+        # whole probe arrived in one read: fall back to bytes over TTFB
+        result["throughput"] = received / max(result["ttfb"], 1e-3)
+    result["bytes"] = received
+    result["ok"] = received > 0
+    return result
+
+def predict_download_time(probe, size=None):
+    """Predicted seconds to fetch the whole ISO from a probed mirror (inf when unusable)."""
+    if not probe.get("ok") or probe.get("throughput", 0) <= 0:
+        return float("inf")
+    size = size or probe.get("total") or ISO_SIZE_ESTIMATE
+    return probe["connect"] + probe["ttfb"] + size / probe["throughput"]
+
+def _discover_iso_filename(mirrors, attempts=3, engine=DEFAULT_ENGINE):
+    """
+    Current ISO filename from the shared release record (see get_release); falls back
+    to scanning the /iso/latest/ listing of the first few mirrors that answer.
+    """
+    urls = [m.url for m in mirrors if m.protocol in ("http", "https")]
+    release = get_release(urls, attempts, engine=engine)
+    if release:
+        return release["filename"]
+    for url in urls[:attempts]:
+        iso_url = _latest_from_listing(url)
+        if iso_url:
+            return os.path.basename(iso_url)
+    return None
+
+def _effective_speed(probe):
+    """ISO size / predicted download time, in MB/s (0.0 when the probe failed)."""
+    size = probe.get("total") or ISO_SIZE_ESTIMATE
+    predicted = predict_download_time(probe, size)
+    return size / predicted / (1024 * 1024) if predicted != float("inf") else 0.0
+
+def _confidence_interval(samples, z=1.96):
+    """Mean and ~95% interval of throughput samples (bytes/s); (mean, 0, inf) with < 2 samples."""
+    if not samples:
+        return 0.0, 0.0, float("inf")
+    mean = sum(samples) / len(samples)
+    if len(samples) < 2:
+        return mean, 0.0, float("inf")
+    var = sum((x - mean) ** 2 for x in samples) / (len(samples) - 1)
+    half = z * math.sqrt(var / len(samples))
+    return mean, max(0.0, mean - half), mean + half
+
+# concurrent probing: pool size and overall deadline for a ranking pass
+PROBE_WORKERS = 16
+PROBE_DEADLINE = 12
+
+@profiled("probing")
+def _probe_concurrently(mirrors, iso_filename, probe_bytes, max_workers=PROBE_WORKERS,
+                        deadline=PROBE_DEADLINE, on_probe=None, engine=DEFAULT_ENGINE):
+    """
+    Run probe_mirror for every mirror, at most max_workers at a time (a thread pool,
+    or concurrent tasks on one event loop with engine="asyncio").
+    on_probe(probe, mirror) is called as each probe finishes; probes still running at
+    `deadline` are abandoned. Returns the finished (probe, mirror) pairs.
+    """
+    done = []
+    if not mirrors:
+        return done
+
+    def finished(probe, mirror):
+        done.append((probe, mirror))
+        record_probe_metrics(probe, engine)
+        # small probes undershoot real throughput, so they move the history less
+        record_mirror_sample(mirror.url, probe.get("throughput"), probe.get("ttfb"),
+                             probe.get("ok", False), weight=min(0.5, 0.1 + probe_bytes / (8 * 1024 * 1024)))
+        if on_probe:
+            try:
+                on_probe(probe, mirror)
+            except Exception:
+                logging.exception("probe callback failed")
+
+    if engine == "asyncio":
+        try:
+            asyncio.run(aio_probe_all(mirrors, iso_filename, probe_bytes, max_workers, deadline, finished))
+        finally:
+            save_mirror_stats()
+            flush_prometheus()
+        return done
+
+    pool = ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(mirrors))))
+    futures = {pool.submit(probe_mirror, m.url, iso_filename, probe_bytes): m for m in mirrors}
+    try:
+        for fut in as_completed(futures, timeout=deadline):
+            try:
+                probe = fut.result()
+            except Exception:
+                probe = {"ok": False}
+            finished(probe, futures[fut])
+    except FuturesTimeout:
+        logging.info("Probe deadline reached: %d/%d probes finished", len(done), len(mirrors))
+    finally:
+        for fut in futures:
+            fut.cancel()
+        pool.shutdown(wait=False)
+        save_mirror_stats()
+        flush_prometheus()
+    return done
+
+def rank_mirrors(mirrors, max_workers=PROBE_WORKERS, deadline=PROBE_DEADLINE, on_result=None,
+                 iso_filename=None, probe_bytes=PROBE_BYTES, engine=DEFAULT_ENGINE):
+    """
+    Probe mirrors concurrently with probe_mirror and rank them by predicted time for
+    the full ISO (connect + TTFB + size / sustained throughput).
+    - the ranking carries an effective speed in MB/s: ISO size / predicted time
+    - on_result(ranked) is called after every finished probe with the ranking so far,
+      so callers can show results live and pick a mirror before slow ones time out.
+    - probes still running when `deadline` seconds have passed are abandoned; those
+      mirrors are appended with speed 0.0.
+    Returns a list of (speed_mb_s, mirror) pairs.
+    """
+    ranked = []
+    if not mirrors:
+        return ranked
+    iso_filename = iso_filename or _discover_iso_filename(mirrors, engine=engine)
+    if not iso_filename:
+        logging.error("rank_mirrors: could not discover the ISO filename")
+        return [(0.0, m) for m in mirrors]
+
+    def on_probe(probe, mirror):
+        ranked.append((_effective_speed(probe), mirror))
+        ranked.sort(key=lambda x: x[0], reverse=True)
+        if on_result:
+            on_result(list(ranked))
+
+    _probe_concurrently(mirrors, iso_filename, probe_bytes, max_workers, deadline, on_probe, engine)
+    probed = {id(m) for _, m in ranked}
+    ranked.extend((0.0, m) for m in mirrors if id(m) not in probed)
+    return ranked
+
+# successive halving: first probe size, growth per round, share of mirrors kept per
+# round, and the total bytes/seconds one adaptive ranking may spend
+ADAPTIVE_FIRST_PROBE = 64 * 1024
+ADAPTIVE_GROWTH = 4
+ADAPTIVE_KEEP = 0.5
+ADAPTIVE_BYTE_BUDGET = 32 * 1024 * 1024
+ADAPTIVE_TIME_BUDGET = 20
+DEFAULT_BACKUPS = 3
+
+def rank_mirrors_adaptive(mirrors, byte_budget=ADAPTIVE_BYTE_BUDGET, time_budget=ADAPTIVE_TIME_BUDGET,
+                          backups=DEFAULT_BACKUPS, on_result=None, iso_filename=None,
+                          max_workers=PROBE_WORKERS, use_history=True, engine=DEFAULT_ENGINE):
+    """
+    Budgeted mirror ranking by successive halving:
+    - every candidate gets a tiny probe (ADAPTIVE_FIRST_PROBE bytes)
+    - the best ADAPTIVE_KEEP share survives and gets a probe ADAPTIVE_GROWTH times larger
+    - repeat until one winner and `backups` backups remain, or the byte/time budget is spent
+    With use_history, candidates are pre-ordered by the mirror history; when enough of
+    them have fresh history only those (plus HISTORY_EXPLORE unknown mirrors) are probed
+    and the tiny first rounds are skipped.
+    Returns a list of dicts, best first:
+      {"mirror", "speed" (effective MB/s), "ci" (low, high MB/s throughput), "probe", "round"}
+    The first entry is "confident" when its interval lies above the runner-up's.
+    on_result(results) is called with the current ranking after every finished probe.
+    engine selects how probes run concurrently (see _probe_concurrently).
+    """
+    if not mirrors:
+        return []
+    iso_filename = iso_filename or _discover_iso_filename(mirrors, engine=engine)
+    if not iso_filename:
+        logging.error("rank_mirrors_adaptive: could not discover the ISO filename")
+        return [{"mirror": m, "speed": 0.0, "ci": (0.0, 0.0), "probe": None, "round": 0} for m in mirrors]
+
+    lock = threading.Lock()
+    results = {id(m): {"mirror": m, "speed": 0.0, "ci": (0.0, 0.0), "probe": None, "round": 0} for m in mirrors}
+
+    def ranking():
+        # later rounds first (they measured more), then by effective speed
+        return sorted(results.values(), key=lambda r: (r["round"], r["speed"]), reverse=True)
+
+    started = time.time()
+    spent = 0
+    survivors = list(mirrors)
+    probe_bytes = ADAPTIVE_FIRST_PROBE
+    if use_history:
+        # unprobed mirrors are listed by what history predicts for them
+        for m in mirrors:
+            results[id(m)]["speed"] = history_speed(m.url)
+        survivors = order_by_history(mirrors)
+        fresh = [m for m in survivors if history_is_fresh(m.url)]
+        if len(fresh) >= 1 + backups:
+            stats = load_mirror_stats()
+            unknown = [m for m in survivors if _mirror_key(m.url) not in stats][:HISTORY_EXPLORE]
+            survivors = fresh[:2 * (1 + backups)] + unknown
+            probe_bytes = ADAPTIVE_FIRST_PROBE * ADAPTIVE_GROWTH ** 2
+            logging.info("Fresh history for %d mirrors: probing %d", len(fresh), len(survivors))
+        if on_result:
+            on_result(ranking())
+    rnd = 0
+    while survivors:
+        rnd += 1
+        remaining_time = time_budget - (time.time() - started)
+        size = min(probe_bytes, (byte_budget - spent) // len(survivors))
+        if remaining_time <= 0 or size < ADAPTIVE_FIRST_PROBE:
+            break
+
+        def on_probe(probe, mirror, rnd=rnd):
+            mean, low, high = _confidence_interval(probe.get("samples") or [probe.get("throughput", 0.0)])
+            with lock:
+                if probe.get("ok"):
+                    results[id(mirror)].update(speed=_effective_speed(probe), probe=probe, round=rnd,
+                                               ci=(low / (1024 * 1024), high / (1024 * 1024)))
+                else:
+                    # keep its earlier round so a failed survivor sinks below measured mirrors
+                    results[id(mirror)].update(speed=0.0, probe=probe, ci=(0.0, 0.0))
+                current = ranking()
+            if on_result:
+                on_result(current)
+
+        finished = _probe_concurrently(survivors, iso_filename, size, max_workers, remaining_time, on_probe, engine)
+        spent += sum(p.get("bytes", 0) for p, _ in finished)
+        ok = sorted((m for p, m in finished if p.get("ok")), key=lambda m: results[id(m)]["speed"], reverse=True)
+        if len(ok) <= 1 + backups:
+            break
+        survivors = ok[:max(1 + backups, math.ceil(len(ok) * ADAPTIVE_KEEP))]
+        probe_bytes *= ADAPTIVE_GROWTH
+
+    ranked = ranking()
+    if len(ranked) > 1:
+        ranked[0]["confident"] = ranked[0]["ci"][0] > ranked[1]["ci"][1]
+    logging.info("Adaptive ranking: %d rounds, %d bytes, %.1fs", rnd, spent, time.time() - started)
+    return ranked
+
+# -----------------------
+# ISO release metadata (sha256sums.txt, shared across mirrors)
+# -----------------------
+# dated ISO names only: iso/latest/ also carries an undated alias of the same image
+ISO_NAME_RE = re.compile(r"^archlinux-(\d{4}\.\d{2}\.\d{2})-x86_64\.iso$")
+
+_release = None
+_release_lock = threading.Lock()
+
+def parse_sha256sums(text):
+    """{filename: sha256 hex} from the lines of a sha256sums.txt."""
+    sums = {}
+    for line in text.splitlines():
+        parts = line.split()
+        if len(parts) == 2 and len(parts[0]) == 64:
+            sums[parts[1].lstrip("*")] = parts[0].lower()
+    return sums
+
+def _release_from_sums(text, source=None):
+    """
+    Release record from a sha256sums.txt: {"filename", "version", "sha256", "sums",
+    "source" (the sha256sums.txt URL), "fetched_at"}, or None when it lists no dated
+    x86_64 ISO.
+    """
+    sums = parse_sha256sums(text)
+    dated = sorted((m.group(1), name) for name in sums for m in [ISO_NAME_RE.match(name)] if m)
+    if not dated:
+        return None
+    version, filename = dated[-1]
+    return {"filename": filename, "version": version, "sha256": sums[filename], "sums": sums,
+            "source": source, "fetched_at": time.time()}
+
+def cached_release(ttl=RELEASE_TTL):
+    """The release record when it was fetched less than ttl seconds ago (memory, then RELEASE_CACHE)."""
+    global _release
+    with _release_lock:
+        if _release is None:
+            try:
+                if os.path.exists(RELEASE_CACHE):
+                    with open(RELEASE_CACHE, "r", encoding="utf-8") as f:
+                        _release = json.load(f)
+            except Exception:
+                logging.exception("Failed loading release cache")
+            _release = _release or {}
+        # records from older versions may have been fetched over plain HTTP
+        if (_release and str(_release.get("source")).startswith("https://")
+                and time.time() - _release.get("fetched_at", 0) < ttl):
+            return _release
+    return None
+
+def _store_release(release):
+    global _release
+    with _release_lock:
+        _release = release
+        try:
+            with open(RELEASE_CACHE + ".tmp", "w", encoding="utf-8") as f:
+                json.dump(release, f)
+            os.replace(RELEASE_CACHE + ".tmp", RELEASE_CACHE)
+        except Exception:
+            logging.exception("Failed saving release cache")
+    logging.info("Current release %s (%s) from %s", release["version"], release["filename"], release["source"])
+
+def _fetch_release(mirror_url):
+    """Release record from one mirror's sha256sums.txt (over HTTPS), or None."""
+    url = get_checksum_url(mirror_url)
+    try:
+        resp = get_session().get(url, timeout=10)
+        resp.raise_for_status()
+        return _release_from_sums(resp.text, url)
+    except Exception:
+        logging.exception("Fetching sha256sums.txt failed for %s", mirror_url)
+        return None
+
+def _newest_release(releases):
+    releases = [r for r in releases if r]
+    return max(releases, key=lambda r: r["version"]) if releases else None
+
+@profiled("discovery")
+def get_release(mirror_urls, attempts=3, ttl=RELEASE_TTL, engine=DEFAULT_ENGINE):
+    """
+    Current ISO release: filename, version and expected SHA-256 in one small request.
+    sha256sums.txt is read from the first `attempts` mirrors at once and the newest
+    version wins (a lagging mirror cannot pin an old ISO). The record is cached for
+    ttl seconds and shared by every mirror, so discovery, ranking probes, the
+    download and verification need no further metadata requests. None when no
+    mirror answered.
+    """
+    release = cached_release(ttl)
+    if release:
+        return release
+    urls = [u for u in mirror_urls if u.startswith(("http://", "https://"))][:attempts]
+    if not urls:
+        return None
+    if engine == "asyncio":
+        release = asyncio.run(aio_get_release(urls))
+    else:
+        with ThreadPoolExecutor(max_workers=len(urls)) as pool:
+            release = _newest_release(pool.map(_fetch_release, urls))
+    if release:
+        _store_release(release)
+    return release
+
+def get_latest_iso_url(mirror_url):
+    """
+    URL of the current ISO on mirror_url. The filename comes from the shared release
+    record; the /iso/latest/ listing is only parsed when sha256sums.txt is unavailable.
+    """
+    release = get_release([mirror_url])
+    if release:
+        return mirror_iso_url(mirror_url, release["filename"])
+    return _latest_from_listing(mirror_url)
+
+@profiled("discovery")
+def _latest_from_listing(mirror_url):
+    """
+    Parse /iso/latest/ HTML and return first .iso link found.
+    Returns absolute URL when possible.
+    """
+    iso_page = mirror_url.rstrip("/") + "/iso/latest/"
+    try:
+        resp = get_session().get(iso_page, timeout=10)
+        resp.raise_for_status()
+        return _find_iso_link(resp.text, iso_page)
+    except Exception:
+        logging.exception("get_latest_iso_url failed for %s", mirror_url)
+    return None
+
+def _find_iso_link(html, iso_page):
+    """First .iso link in a directory listing, made absolute against iso_page."""
+    for line in html.splitlines():
+        if ".iso" in line and "href" in line:
+            start = line.find("href=\"")
+            if start >= 0:
+                start += 6
+                end = line.find(".iso", start)
+                if end >= 0:
+                    end += 4
+                    href = line[start:end]
+                    if href.startswith("http"):
+                        return href
+                    return iso_page + href.lstrip("/")
+    return None
+
+def get_checksum_url(mirror_url):
+    """
+    URL of sha256sums.txt (checksums for every file) in mirror's iso/latest/ folder,
+    always over HTTPS: the checksum is what authenticates an ISO fetched over plain HTTP.
+    """
+    iso_page = https_url(mirror_url).rstrip("/") + "/iso/latest/"
+    return iso_page + "sha256sums.txt"
+
+def get_remote_info(iso_url, timeout=10):
+    """
+    Learn size, Range support and validators of a remote file with a one-byte Range
+    request. Returns {"total", "ranges", "etag", "last_modified"}; total is 0 when unknown.
+    """
+    info = {"total": 0, "ranges": False, "etag": None, "last_modified": None}
+    try:
+        with get_session().get(iso_url, stream=True, timeout=timeout, headers={"Range": "bytes=0-0"}) as r:
+            r.raise_for_status()
+            info.update(_validators(r.headers))
+            if r.status_code == 206:
+                r.content  # drain the single byte so the connection goes back to the pool
+                content_range = r.headers.get("Content-Range", "")
+                info.update(total=int(content_range.split("/")[-1]), ranges=True)
+            else:
+                info["total"] = int(r.headers.get("content-length", 0))
+    except Exception:
+        logging.exception("get_remote_info failed for %s", iso_url)
+    return info
+
+# -----------------------
+# Failover: backoff with jitter + per-mirror circuit breaker
+# -----------------------
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 15.0
+# consecutive failures after which a mirror's circuit breaker opens and it is skipped
+BREAKER_THRESHOLD = 3
+# seconds an open breaker stays open; after that the mirror may be tried again
+# (half-open): success closes the breaker, another failure re-opens it
+BREAKER_COOLDOWN = 60.0
+
+_breakers = {}  # _mirror_key -> [consecutive failures, time the breaker last opened]
+_breakers_lock = threading.Lock()
+
+def backoff_delay(attempt):
+    """Exponential backoff for the given 0-based retry, with jitter in [50%, 100%]."""
+    return min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt) * random.uniform(0.5, 1.0)
+
+def _pause(seconds, stop_event=None):
+    """Sleep, returning early when stop_event is set."""
+    if stop_event:
+        stop_event.wait(seconds)
+    else:
+        time.sleep(seconds)
+
+def mirror_failed(url):
+    """Count a failure against url's mirror; True once its circuit breaker is open."""
+    key = _mirror_key(url)
+    with _breakers_lock:
+        breaker = _breakers.setdefault(key, [0, 0.0])
+        breaker[0] += 1
+        tripped = breaker[0] == BREAKER_THRESHOLD
+        is_open = breaker[0] >= BREAKER_THRESHOLD
+        if is_open:
+            # a failed trial after the cool-down opens it again
+            breaker[1] = time.time()
+    if tripped:
+        logging.warning("Circuit breaker open for %s: skipping it for %.0f s", key, BREAKER_COOLDOWN)
+    return is_open
+
+def mirror_succeeded(url):
+    """Reset url's failure count (closing its breaker) after a successful transfer or probe."""
+    with _breakers_lock:
+        _breakers.pop(_mirror_key(url), None)
+
+def mirror_available(url):
+    """False while url's mirror has an open circuit breaker (until BREAKER_COOLDOWN passes)."""
+    with _breakers_lock:
+        failures, opened = _breakers.get(_mirror_key(url), (0, 0.0))
+    return failures < BREAKER_THRESHOLD or time.time() - opened >= BREAKER_COOLDOWN
+
+def reset_breakers():
+    """Close every circuit breaker; each download_iso run starts with all mirrors usable."""
+    with _breakers_lock:
+        _breakers.clear()
+
+# -----------------------
+# Stall watchdog (live mirror switching)
+# -----------------------
+# rolling throughput is measured over this many seconds
+STALL_WINDOW = 10.0
+# a new connection is not judged before it has run this long
+STALL_GRACE = 8.0
+# rolling speed below this share of the expected rate counts as a collapse
+STALL_RATIO = 0.3
+# a backup must promise at least this multiple of the rolling speed
+STALL_GAIN = 2.0
+# below this rate (bytes/s) mirrors without history are worth trying too
+STALL_FLOOR = 64 * 1024
+
+# receive path: bodies are read straight into the disk writer's pool buffers (see
+# new_writer); the read size starts at RECV_MIN and doubles while reads fill it within
+# RECV_TARGET seconds, halving when a read takes over 4 * RECV_TARGET (up to RECV_MAX
+# bytes per read, one pool buffer)
+RECV_MIN = 16 * 1024
+RECV_MAX = 1024 * 1024
+RECV_TARGET = 0.05
+
+def _iter_body(r, writer, chunk_size=None, max_size=RECV_MAX):
+    """
+    Yield the body of a streamed requests response as memoryviews of writer's pool
+    buffers (writer_buffer), filled by readinto on the underlying http.client response.
+    Passing a chunk, or a prefix of it, to writer_put hands its buffer to the writer
+    without a copy; a chunk that is not handed over is only valid until the next one
+    is requested, which reuses its buffer.
+    The read size adapts to the link (see RECV_MIN/RECV_TARGET), so a fast mirror is
+    read a megabyte at a time and a trickling one still yields often enough for the
+    watchdog; chunk_size fixes it instead, and no read exceeds max_size. Encoded bodies
+    and urllib3 responses without an http.client response underneath use _iter_body_copy.
+    """
+    fp = getattr(r.raw, "_original_response", None)
+    if fp is None or not hasattr(fp, "readinto") or r.headers.get("Content-Encoding", "identity") != "identity":
+        yield from _iter_body_copy(r, chunk_size or 131072)
+        return
+    max_size = min(max_size, RECV_MAX)
+    size = min(chunk_size or RECV_MIN, max_size)
+    buf = None
+    try:
+        while True:
+            if buf is None or writer["lent"].get(id(buf)) != threading.get_ident():
+                buf = writer_buffer(writer)  # the last one went to the writer
+            started = time.perf_counter()
+            n = fp.readinto(memoryview(buf)[:size])
+            if not n:
+                break
+            if not chunk_size:
+                took = time.perf_counter() - started
+                if n == size and took < RECV_TARGET and size < max_size:
+                    size = min(size * 2, max_size)
+                elif took > 4 * RECV_TARGET and size > RECV_MIN:
+                    size //= 2
+            yield memoryview(buf)[:n]
+    finally:
+        if buf is not None:
+            writer_return(writer, buf)
+    if fp.isclosed():
+        # the body was read past urllib3, so hand the connection back to the pool here
+        r.raw.release_conn()
+
+def _iter_body_copy(r, chunk_size=131072):
+    """
+    Yield the body of a streamed requests response as bytes. urllib3's read1 returns
+    whatever has arrived, so a trickling mirror still yields often enough for the
+    watchdog; iter_content (which waits for full chunks) is the fallback for older urllib3.
+    """
+    read1 = getattr(r.raw, "read1", None)
+    if read1 is None:
+        yield from r.iter_content(chunk_size=chunk_size)
+        return
+    while True:
+        data = read1(chunk_size)
+        if not data:
+            return
+        yield data
+
+def new_watchdog(url):
+    """Throughput watchdog for one connection to url (see watchdog_feed/watchdog_verdict)."""
+    return {"url": url, "expected": history_rate(url), "peak": 0.0, "rolling": 0.0,
+            "started": time.time(), "checked": 0.0, "marks": collections.deque()}
+
+def watchdog_feed(wd, received, now=None):
+    """Record the connection's running byte count; returns the rolling rate in bytes/s."""
+    now = now or time.time()
+    marks = wd["marks"]
+    if marks and now - marks[-1][0] < 0.25:
+        return wd["rolling"]
+    marks.append((now, received))
+    while len(marks) > 2 and now - marks[1][0] >= STALL_WINDOW:
+        marks.popleft()
+    first_t, first_b = marks[0]
+    if now > first_t:
+        wd["rolling"] = (received - first_b) / (now - first_t)
+        if now - first_t >= STALL_WINDOW / 2:
+            wd["peak"] = max(wd["peak"], wd["rolling"])
+    return wd["rolling"]
+
+def watchdog_verdict(wd, candidates, now=None):
+    """
+    None while the connection keeps up; once its rolling speed has collapsed below
+    STALL_RATIO of what the mirror promised (history, or its own best window), the
+    URL from candidates to move the remaining range to: the one whose history rate
+    is highest and at least STALL_GAIN times the current speed.
+    """
+    now = now or time.time()
+    if now - wd["started"] < STALL_GRACE or now - wd["checked"] < 1.0:
+        return None
+    wd["checked"] = now
+    rolling = wd["rolling"]
+    expected = max(wd["expected"], wd["peak"])
+    if not expected or rolling >= STALL_RATIO * expected:
+        return None
+    best, best_rate = None, STALL_GAIN * rolling
+    for url in candidates:
+        if _mirror_key(url) == _mirror_key(wd["url"]) or not mirror_available(url):
+            continue
+        rate = history_rate(url)
+        if rate > best_rate or (best is None and not rate and rolling < STALL_FLOOR):
+            best, best_rate = url, max(rate, best_rate)
+    if best:
+        logging.warning("Stall on %s: %.0f B/s against %.0f B/s expected; switching to %s",
+                        wd["url"], rolling, expected, best)
+        record_mirror_sample(wd["url"], rolling, weight=0.5)
+    return best
+
+# -----------------------
+# Resume state sidecar
+# -----------------------
+def _state_path(filename):
+    """Path of the JSON sidecar holding resume state for a partial download."""
+    return filename + ".state.json"
+
+def _load_state(filename):
+    """Load resume state for filename; returns {} when missing or unreadable."""
+    try:
+        path = _state_path(filename)
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+    except Exception:
+        logging.exception("Failed loading resume state for %s", filename)
+    return {}
+
+def _save_state(filename, state):
+    """Atomically write resume state next to filename."""
+    path = _state_path(filename)
+    tmp = path + ".tmp"
+    try:
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+        os.replace(tmp, path)
+    except Exception:
+        logging.exception("Failed saving resume state for %s", filename)
+
+def _clear_state(filename):
+    """Remove the resume state sidecar once a download is complete."""
+    try:
+        os.remove(_state_path(filename))
+    except FileNotFoundError:
+        pass
+    except Exception:
+        logging.exception("Failed removing resume state for %s", filename)
+
+# The sidecar ties a partial file to the remote file it came from:
+#   {"name", "total", "mirror" (last source URL), "validators": {mirror key: {"etag",
+#    "last_modified"}}, "segments" (segmented downloads only)}
+# Validators differ between mirrors (each server makes its own ETag and mtime), so
+# they are kept per mirror and only sent back to the mirror that issued them.
+
+def _validators(headers):
+    """ETag and Last-Modified from response headers (any header-name case)."""
+    lowered = {k.lower(): v for k, v in headers.items()}
+    return {"etag": lowered.get("etag"), "last_modified": lowered.get("last-modified")}
+
+def _remember_validators(state, url, headers):
+    """Record url's validators (and url as the latest source) in the resume state."""
+    found = {k: v for k, v in _validators(headers).items() if v}
+    if found:
+        state.setdefault("validators", {})[_mirror_key(url)] = found
+    state["mirror"] = url
+
+def _if_range(state, url):
+    """
+    If-Range header for a resume request to url: its strong ETag, else its Last-Modified;
+    {} when this mirror has not served the partial file before.
+    """
+    known = state.get("validators", {}).get(_mirror_key(url), {})
+    etag = known.get("etag")
+    if etag and not etag.startswith("W/"):
+        return {"If-Range": etag}  # weak ETags are not allowed in If-Range
+    if known.get("last_modified"):
+        return {"If-Range": known["last_modified"]}
+    return {}
+
+def _same_remote(state, url, info):
+    """False when get_remote_info(url) shows the file changed since state was written."""
+    if state.get("total") and info.get("total") and state["total"] != info["total"]:
+        return False
+    known = state.get("validators", {}).get(_mirror_key(url), {})
+    for key in ("etag", "last_modified"):
+        if known.get(key) and info.get(key):
+            return known[key] == info[key]
+    return True
+
+def _discard_partial(filename):
+    """Remove a partial download and its sidecars."""
+    _clear_state(filename)
+    _clear_manifest(filename)
+    try:
+        os.remove(filename)
+    except FileNotFoundError:
+        pass
+    except Exception:
+        logging.exception("Failed removing partial file %s", filename)
+
+# -----------------------
+# Write-behind disk writer
+# -----------------------
+# network readers receive into a pool of WRITE_BLOCKS buffers of WRITE_BLOCK bytes,
+# hand each filled buffer to the writer and go back to the socket; one writer thread per
+# file pwrite()s them at their offsets and returns them to the pool. When every buffer
+# is in flight readers wait for the disk (backpressure), so at most
+# WRITE_BLOCKS * WRITE_BLOCK bytes are held in memory.
+WRITE_BLOCK = RECV_MAX
+WRITE_BLOCKS = 32
+# checkpoints fsync the file at most this often (seconds)
+WRITE_SYNC_INTERVAL = 5.0
+
+def new_writer(filename, truncate=False):
+    """
+    Open filename (created if missing, emptied with truncate) and start its writer
+    thread. Feed it with writer_put and writer_checkpoint, finish with writer_close.
+    """
+    flags = os.O_WRONLY | os.O_CREAT | (os.O_TRUNC if truncate else 0) | getattr(os, "O_BINARY", 0)
+    w = {"filename": filename, "fd": os.open(filename, flags, 0o644), "queue": queue.Queue(),
+         "free": queue.Queue(), "lent": {}, "error": None, "pending": False, "synced": time.time(),
+         "bytes": 0, "writes": 0, "fsyncs": 0, "waited": 0.0, "write_seconds": 0.0}
+    for _ in range(WRITE_BLOCKS):
+        w["free"].put(bytearray(WRITE_BLOCK))
+    w["thread"] = threading.Thread(target=_writer_loop, args=(w,), daemon=True)
+    w["thread"].start()
+    return w
+
+def _pwrite(fd, data, offset):
+    """Write all of data at offset (os.pwrite where available, else seek + write)."""
+    view = memoryview(data)
+    while view:
+        if hasattr(os, "pwrite"):
+            n = os.pwrite(fd, view, offset)
+        else:
+            os.lseek(fd, offset, os.SEEK_SET)
+            n = os.write(fd, view)
+        offset += n
+        view = view[n:]
+
+def _writer_loop(w):
+    """Writer thread: write queued blocks in order and run checkpoints once reached."""
+    while True:
+        item = w["queue"].get()
+        if item is None:
+            return
+        offset, data, n = item
+        if offset is None:
+            # a checkpoint: every byte queued before it is written by now
+            save, sync = data, n
+            try:
+                if not w["error"]:
+                    if sync or time.time() - w["synced"] >= WRITE_SYNC_INTERVAL:
+                        os.fsync(w["fd"])
+                        w["synced"], w["fsyncs"] = time.time(), w["fsyncs"] + 1
+                    if save:
+                        save()
+            except Exception as e:
+                logging.exception("Checkpoint of %s failed", w["filename"])
+                w["error"] = w["error"] or e
+            w["pending"] = False
+            continue
+        try:
+            if not w["error"]:
+                started = time.perf_counter()
+                _pwrite(w["fd"], memoryview(data)[:n], offset)
+                w["write_seconds"] += time.perf_counter() - started
+                w["bytes"] += n
+                w["writes"] += 1
+        except Exception as e:
+            logging.exception("Writing %d bytes at %d to %s failed", n, offset, w["filename"])
+            w["error"] = e
+        # the buffer goes back even after an error, so readers never wait forever
+        w["free"].put(data)
+
+def writer_buffer(w, block=True):
+    """
+    Lend a free pool buffer to the calling thread, to receive into and pass to
+    writer_put (or writer_return). With every buffer in flight this waits for the disk,
+    or returns None with block=False. Raises the writer's error once a write has failed.
+    """
+    if w["error"]:
+        raise w["error"]
+    try:
+        buf = w["free"].get_nowait()
+    except queue.Empty:
+        if not block:
+            return None
+        started = time.perf_counter()
+        buf = w["free"].get()
+        w["waited"] += time.perf_counter() - started
+    w["lent"][id(buf)] = threading.get_ident()
+    return buf
+
+def writer_return(w, buf):
+    """Give back a buffer lent to this thread that was not passed to writer_put."""
+    if w["lent"].get(id(buf)) == threading.get_ident():
+        del w["lent"][id(buf)]
+        w["free"].put(buf)
+
+def writer_put(w, offset, data, block=True):
+    """
+    Queue data for writing at offset and return how many bytes were queued. A
+    memoryview over the start of a lent buffer (a chunk from _iter_body) is handed to
+    the writer as it is; other data (bytes from the asyncio engine) is copied into pool
+    buffers, so the caller may reuse it at once. With every buffer in flight the copy
+    waits for the disk, or returns early with block=False. Raises the writer's error
+    once a write has failed.
+    """
+    view = memoryview(data)
+    if w["lent"].get(id(view.obj)) == threading.get_ident():
+        buf = view.obj
+        del w["lent"][id(buf)]
+        if w["error"]:
+            w["free"].put(buf)
+            raise w["error"]
+        w["queue"].put((offset, buf, len(view)))
+        return len(view)
+    queued = 0
+    while queued < len(view):
+        buf = writer_buffer(w, block)
+        if buf is None:
+            break
+        del w["lent"][id(buf)]
+        n = min(len(buf), len(view) - queued)
+        buf[:n] = view[queued:queued + n]
+        w["queue"].put((offset + queued, buf, n))
+        queued += n
+    return queued
+
+def writer_checkpoint(w, save=None, sync=False):
+    """
+    Run save() on the writer thread once everything queued so far is written, after an
+    fsync when sync is set or WRITE_SYNC_INTERVAL has passed since the last one, so a
+    resume sidecar saved there never claims bytes that are not on disk. Returns False
+    (and queues nothing) while the previous checkpoint is still waiting for the disk.
+    """
+    if w["pending"]:
+        return False
+    w["pending"] = True
+    w["queue"].put((None, save, sync))
+    return True
+
+def writer_close(w, sync=True):
+    """
+    Write everything queued, fsync (unless sync is False), stop the writer thread and
+    close the file. Returns True when every write succeeded.
+    """
+    w["pending"] = False
+    writer_checkpoint(w, sync=sync)
+    w["queue"].put(None)
+    w["thread"].join()
+    try:
+        os.close(w["fd"])
+    except OSError as e:
+        w["error"] = w["error"] or e
+    logging.info("Disk writer for %s: %d bytes in %d writes (%.2f s), %d fsyncs, readers waited %.2f s",
+                 w["filename"], w["bytes"], w["writes"], w["write_seconds"], w["fsyncs"], w["waited"])
+    return w["error"] is None
+
+# -----------------------
+# Segmented / swarm download (parallel Range connections)
+# -----------------------
+DEFAULT_CONNECTIONS = 4
+DEFAULT_SWARM_MIRRORS = 3
+MIN_SEGMENT_SIZE = 8 * 1024 * 1024
+# smallest tail a fast connection will take over from a slower one; segment reads are
+# capped at this size, so a cut never falls inside a chunk still being written
+MIN_STEAL_SIZE = 2 * 1024 * 1024
+
+def mirror_iso_url(mirror_url, iso_filename):
+    """Build the URL of iso_filename in a mirror's iso/latest/ folder."""
+    return mirror_url.rstrip("/") + "/iso/latest/" + iso_filename
+
+def _plan_segments(total, connections, existing=0, segment_size=None):
+    """
+    Split [0, total) into byte ranges, one per connection (or of about segment_size
+    bytes each, when given).
+    Bytes below `existing` (a sequential partial file) are treated as already fetched.
+    Each segment is a dict {"start", "end", "pos"} with `end` exclusive; boundaries fall
+    on PIECE_SIZE multiples so every piece is written by a single connection.
+    """
+    if segment_size:
+        count = max(1, math.ceil(total / segment_size))
+    else:
+        count = max(1, min(connections, total // MIN_SEGMENT_SIZE or 1))
+    size = math.ceil(total / count / PIECE_SIZE) * PIECE_SIZE
+    segments = []
+    for start in range(0, total, size):
+        end = min(start + size, total)
+        pos = min(max(existing, start), end)
+        segments.append({"start": start, "end": end, "pos": pos})
+    return segments
+
+def _preallocate(f, start, total):
+    """
+    Reserve disk blocks for bytes start..total of an open file, so the space is claimed
+    before the transfer starts rather than found missing part-way (truncate alone leaves
+    a sparse file). Skipped where posix_fallocate is unavailable or unsupported.
+    """
+    if total > start and hasattr(os, "posix_fallocate"):
+        try:
+            os.posix_fallocate(f.fileno(), start, total - start)
+        except OSError as e:
+            logging.warning("Could not preallocate %s: %s", f.name, e)
+
+def _prepare_segments(filename, name, total, connections, segment_size=None):
+    """
+    Segment plan and piece manifest for a ranged download of `name` into filename.
+    A matching resume sidecar is continued (each unfinished segment from its last
+    verified piece boundary); otherwise a plain partial file is kept and the file is
+    preallocated to total. download_iso has already discarded partial files whose
+    remote changed. Returns (state, manifest), both already saved.
+    """
+    previous = _load_state(filename)
+    validators = previous.get("validators", {}) if previous.get("name") == name else {}
+    if (previous.get("name") == name and previous.get("total") == total and previous.get("segments")
+            and os.path.exists(filename) and os.path.getsize(filename) == total):
+        segments = previous["segments"]
+    else:
+        # a plain partial file from a single-connection run is kept and continued
+        try:
+            existing = os.path.getsize(filename) if os.path.exists(filename) else 0
+        except Exception:
+            existing = 0
+        if existing > total:
+            existing = 0
+        segments = _plan_segments(total, connections, existing, segment_size)
+        with open(filename, "r+b" if existing else "wb") as f:
+            f.truncate(total)
+            _preallocate(f, existing, total)
+    manifest = _load_manifest(filename, name)
+    if not manifest or manifest["total"] != total or manifest["piece_size"] != PIECE_SIZE:
+        manifest = _new_manifest(name, total)
+    else:
+        for seg in segments:
+            if seg["pos"] < seg["end"]:
+                seg["pos"] = _verified_boundary(filename, manifest, seg["start"], seg["pos"])
+    state = {"name": name, "total": total, "mirror": previous.get("mirror"),
+             "validators": validators, "segments": segments}
+    _save_state(filename, state)
+    _save_manifest(filename, manifest)
+    return state, manifest
+
+def _download_segmented(iso_urls, filename, total, connections=DEFAULT_CONNECTIONS, retries=3,
+                        progress_callback=None, stop_event=None, expected_sha256=None, verify_callback=None,
+                        fallbacks=None, metrics=None):
+    """
+    Fetch one file into a preallocated file over several parallel Range connections.
+
+    iso_urls lists the same file on one or more mirrors (swarm mode); connections are
+    spread across them. Workers pull unfinished segments; once none are left, an idle
+    worker takes over the tail of the segment with the most remaining bytes, split in
+    proportion to both workers' measured speed, so fast mirrors end up doing most of the
+    work and stragglers never hold up the finish. A mirror that keeps failing (or trips
+    its circuit breaker) hands its segment back to the others, and its workers fail
+    over to the next unused mirror in fallbacks (ISO URLs in ranked order).
+    Segment progress is kept in the resume sidecar so only unfinished segments are
+    fetched again after a restart; piece hashes are recorded in the manifest sidecar and
+    each segment resumes from the last piece boundary that still matches it.
+    Connections hand their bytes to a write-behind writer (new_writer) and keep reading;
+    both sidecars are saved at writer checkpoints, so they only claim written bytes.
+    With expected_sha256, the SHA-256 follows the contiguous written prefix while the
+    download runs (reading back bytes just written, normally still in the page cache)
+    and is compared at the end. Returns True on success, False on failure, checksum
+    mismatch or cancel.
+    """
+    if isinstance(iso_urls, str):
+        iso_urls = [iso_urls]
+    state, manifest = _prepare_segments(filename, os.path.basename(iso_urls[0]), total, connections)
+    segments = state["segments"]
+    writer = new_writer(filename)
+    # segment positions as of the last checkpoint: bytes below them are on disk
+    written = {"segments": json.loads(json.dumps(segments))}
+
+    lock = threading.Lock()
+    pending = [seg for seg in segments if seg["pos"] < seg["end"]]
+    active = {}  # id(segment) -> owning worker's stats
+    per_url = max(1, connections // len(iso_urls))
+    workers = [{"url": url, "speed": 0.0} for url in iso_urls if mirror_available(url) for _ in range(per_url)]
+    if not workers:
+        workers = [{"url": iso_urls[0], "speed": 0.0}]
+    spare = collections.deque(u for u in (fallbacks or []) if u not in iso_urls)
+    # mirrors a stalled connection may switch to
+    candidates = list(iso_urls) + list(spare)
+    bytes_by_url = collections.defaultdict(int)
+    secs_by_url = collections.defaultdict(float)
+    ttfb_by_url = {}
+
+    def next_spare():
+        """Next fallback mirror with a closed breaker, or None (lock held)."""
+        while spare:
+            url = spare.popleft()
+            if mirror_available(url):
+                return url
+        return None
+
+    def steal(me):
+        """Split the busiest active segment and return its tail for `me` (lock held)."""
+        best, best_remaining = None, 0
+        for seg, owner in active.values():
+            remaining = seg["end"] - seg["pos"]
+            if remaining > best_remaining:
+                best, best_remaining, best_owner = seg, remaining, owner
+        if best is None or best_remaining < 2 * MIN_STEAL_SIZE:
+            return None
+        mine, theirs = me["speed"], best_owner["speed"]
+        share = mine / (mine + theirs) if mine > 0 and theirs > 0 else 0.5
+        cut = best["end"] - max(MIN_STEAL_SIZE, int(best_remaining * share))
+        cut = max(cut, best["pos"] + MIN_STEAL_SIZE)
+        cut += -cut % PIECE_SIZE  # the owner finishes its current piece
+        if cut >= best["end"]:
+            return None
+        tail = {"start": cut, "end": best["end"], "pos": cut}
+        best["end"] = cut
+        segments.append(tail)
+        return tail
+
+    def next_segment(me):
+        """Next piece of work for `me`; None once every segment is finished."""
+        while not (stop_event and stop_event.is_set()):
+            with lock:
+                seg = pending.pop(0) if pending else steal(me)
+                if seg is not None:
+                    active[id(seg)] = (seg, me)
+                    return seg
+                if not active:
+                    return None
+            # segments still held by others may be handed back if their mirror fails
+            time.sleep(0.2)
+        return None
+
+    def release(seg, finished):
+        with lock:
+            active.pop(id(seg), None)
+            if not finished and seg["pos"] < seg["end"]:
+                pending.append(seg)
+
+    def fetch(me, seg):
+        """
+        Fetch the unfinished part of seg, retrying on errors; a stalled connection moves
+        to a better mirror (not counted as a retry). Returns True when complete.
+        """
+        pieces = {}  # running piece hasher, valid across retries since pos only moves forward
+        attempt = 0
+        while attempt < retries:
+            url, started = me["url"], None
+            if stop_event and stop_event.is_set():
+                return False
+            try:
+                with lock:
+                    if seg["pos"] >= seg["end"]:
+                        return True
+                    headers = {"Range": f"bytes={seg['pos']}-{seg['end'] - 1}", **_if_range(state, url)}
+                with get_session().get(url, stream=True, timeout=15, headers=headers) as r:
+                    r.raise_for_status()
+                    if r.status_code != 206:
+                        raise IOError("remote file changed (If-Range)" if "If-Range" in headers
+                                      else "server ignored Range request")
+                    if int(r.headers.get("Content-Range", "/0").split("/")[-1]) != total:
+                        raise IOError("mirror serves a different file size")
+                    with lock:
+                        _remember_validators(state, url, r.headers)
+                    ttfb_by_url[url] = r.elapsed.total_seconds()
+                    started, received = time.time(), 0
+                    watchdog, switch_to = new_watchdog(url), None
+                    # seg["pos"] counts queued bytes; sidecars only record them at a checkpoint
+                    for chunk in _iter_body(r, writer, max_size=MIN_STEAL_SIZE):
+                        if stop_event and stop_event.is_set():
+                            return False
+                        if chunk:
+                            with lock:
+                                # the tail may have been handed to a faster worker meanwhile
+                                chunk = chunk[:seg["end"] - seg["pos"]]
+                            # hashed before writer_put: the buffer belongs to the writer after it
+                            _feed_pieces(manifest, pieces, seg["pos"], chunk)
+                            writer_put(writer, seg["pos"], chunk)
+                            received += len(chunk)
+                            with lock:
+                                seg["pos"] += len(chunk)
+                                bytes_by_url[url] += len(chunk)
+                                elapsed = time.time() - started
+                                if elapsed > 0:
+                                    me["speed"] = received / elapsed
+                                if seg["pos"] >= seg["end"]:
+                                    break
+                            watchdog_feed(watchdog, received)
+                            switch_to = watchdog_verdict(watchdog, candidates)
+                            if switch_to:
+                                break
+                with lock:
+                    if seg["pos"] < seg["end"] and not switch_to:
+                        # readinto just returns 0 when the server closes early
+                        raise IOError(f"connection closed at {seg['pos']} of range {seg['start']}-{seg['end']}")
+                    secs_by_url[url] += time.time() - started
+                    if seg["pos"] >= seg["end"]:
+                        mirror_succeeded(url)
+                        return True
+                    if switch_to:
+                        me["url"], me["speed"] = switch_to, 0.0
+                        metrics_failover(metrics, switch_to)
+                        continue
+            except Exception:
+                if writer["error"]:
+                    return False  # the disk failed, not the mirror
+                logging.exception("segment %d-%d from %s attempt %d failed", seg["start"], seg["end"], url, attempt + 1)
+                record_mirror_sample(url, ok=False)
+                # the failed attempt's bytes are in bytes_by_url; its time is added here
+                metrics_mirror(metrics, url, seconds=time.time() - started if started else 0.0, error=True)
+                if mirror_failed(url):
+                    return False
+                _pause(backoff_delay(attempt), stop_event)
+            attempt += 1
+        return False
+
+    def worker(me):
+        while True:
+            seg = next_segment(me)
+            if seg is None:
+                return
+            ok = fetch(me, seg)
+            release(seg, ok)
+            if not ok:
+                if (stop_event and stop_event.is_set()) or writer["error"]:
+                    return
+                # give up on this mirror; its segment is back in the pool for the others
+                with lock:
+                    me["url"], me["speed"] = next_spare(), 0.0
+                if me["url"] is None:
+                    return
+                logging.info("Failing over to %s", me["url"])
+                metrics_failover(metrics, me["url"])
+
+    def done_bytes():
+        with lock:
+            return sum(seg["pos"] - seg["start"] for seg in segments)
+
+    hasher = hashlib.sha256() if expected_sha256 else None
+    hashed = 0  # the hasher covers bytes [0, hashed)
+
+    def contiguous_prefix():
+        """End of the prefix [0, n) of the file written as of the last checkpoint."""
+        for seg in sorted(written["segments"], key=lambda x: x["start"]):
+            if seg["pos"] < seg["end"]:
+                return seg["pos"]
+        return total
+
+    def checkpoint():
+        """Save copies of both sidecars once the writer has written what they claim."""
+        if writer["pending"]:
+            return
+        with lock:
+            snapshot = json.loads(json.dumps(state))
+        pieces = json.loads(json.dumps(manifest))
+
+        def save():
+            _save_state(filename, snapshot)
+            _save_manifest(filename, pieces)
+            written["segments"] = snapshot["segments"]
+        writer_checkpoint(writer, save)
+
+    def advance_hash(limit=None):
+        """Hash newly completed prefix bytes, at most `limit` of them per call."""
+        nonlocal hashed
+        end = contiguous_prefix()
+        if limit:
+            end = min(end, hashed + limit)
+        if end > hashed:
+            hashed = _hash_file_range(hasher, filename, hashed, end)
+
+    threads = [threading.Thread(target=worker, args=(me,), daemon=True) for me in workers]
+    for t in threads:
+        t.start()
 
-def get_latest_iso_url(mirror_url):
-    """
-    Parse /iso/latest/ HTML and return first .iso link found.
-    Returns absolute URL when possible.
-    """
-    iso_page = mirror_url.rstrip("/") + "/iso/latest/"
-    try:
-        resp = requests.get(iso_page, timeout=10)
-        resp.raise_for_status()
-        for line in resp.text.splitlines():
-            if ".iso" in line and "href" in line:
-                start = line.find("href=\"")
-                if start >= 0:
-                    start += 6
-                    end = line.find(".iso", start)
-                    if end >= 0:
-                        end += 4
-                        href = line[start:end]
-                        if href.startswith("http"):
-                            return href
-                        return iso_page + href.lstrip("/")
-    except Exception:
-        logging.exception("get_latest_iso_url failed for %s", mirror_url)
-    return None
+    downloaded = done_bytes()
+    last_time = time.time()
+    last_downloaded = downloaded
+    if progress_callback:
+        try:
+            progress_callback(downloaded, total, 0.0)
+        except Exception:
+            pass
+    alive = threads
+    while alive:
+        alive[0].join(0.5)
+        alive = [t for t in threads if t.is_alive()]
+        now = time.time()
+        downloaded = done_bytes()
+        speed = (downloaded - last_downloaded) / (now - last_time) if now > last_time else 0.0
+        last_time, last_downloaded = now, downloaded
+        checkpoint()
+        if hasher:
+            advance_hash(HASH_STEP_BYTES)
+        if progress_callback:
+            try:
+                progress_callback(downloaded, total, speed)
+            except Exception:
+                pass
 
-def get_checksum_url(mirror_url, iso_filename):
-    """Construct checksum (.sha256) URL for iso in mirror's iso/latest/ folder."""
-    iso_page = mirror_url.rstrip("/") + "/iso/latest/"
-    checksum_file = iso_filename + ".sha256"
-    return iso_page + checksum_file
+    if writer_close(writer):
+        with lock:
+            _save_state(filename, state)
+        _save_manifest(filename, manifest)
+        written["segments"] = segments
+    else:
+        # the sidecars keep the last checkpoint, which only claims written bytes
+        logging.error("Writing %s failed: %s", filename, writer["error"])
+    metrics_writer(metrics, writer)
+    downloaded = done_bytes()
+    if progress_callback:
+        try:
+            progress_callback(downloaded, total, 0.0)
+        except Exception:
+            pass
+    for url, count in bytes_by_url.items():
+        logging.info("Fetched %d bytes from %s", count, url)
+        metrics_mirror(metrics, url, count, secs_by_url[url], ttfb_by_url.get(url))
+        if count and secs_by_url[url] > 0:
+            # per-connection rate, comparable with single-stream probes and downloads
+            record_mirror_sample(url, count / secs_by_url[url], ttfb_by_url.get(url), weight=0.5)
+    save_mirror_stats()
+    if stop_event and stop_event.is_set():
+        logging.info("Download cancelled by user")
+        return False
+    if writer["error"]:
+        return False
+    if downloaded < total:
+        logging.error("Segmented download incomplete: %d/%d bytes", downloaded, total)
+        return False
+    _clear_state(filename)
+    logging.info("Download completed: %s (%d connections, %d mirrors)", filename, len(threads), len(bytes_by_url))
+    if hasher:
+        advance_hash()
+        return _check_digest(hasher, expected_sha256, filename, verify_callback)
+    return True
 
 # -----------------------
 # Download with resume + progress + cancel
 # -----------------------
-def download_iso(iso_url, filename, lang="en", retries=3, progress_callback=None, stop_event=None):
+@profiled("download")
+def download_iso(iso_url, filename, lang="en", retries=3, progress_callback=None, stop_event=None,
+                 connections=1, sources=None, expected_sha256=None, verify_callback=None,
+                 engine=DEFAULT_ENGINE, fallbacks=None):
     """
     Download ISO with support for:
     - resuming via HTTP Range if server supports it
     - reporting progress via progress_callback(downloaded_bytes, total_bytes, speed_bytes_per_sec)
     - cancellation via stop_event (threading.Event)
-    Returns True on success, False on failure or cancelled.
+    - segmented mode: connections > 1 fetches byte ranges in parallel (falls back to a
+      single stream when the server does not accept Range)
+    - swarm mode: sources lists the same ISO on other mirrors; byte ranges are spread
+      across all of them (see mirror_iso_url)
+    - failover: fallbacks lists the ISO on further mirrors in ranked order; after errors
+      the download continues at the current offset on the next one (exponential backoff
+      with jitter, and a per-mirror circuit breaker with a cool-down; breakers are
+      reset at the start of each call)
+    - verification: with expected_sha256 the SHA-256 is computed as bytes arrive and
+      checked at the end; verify_callback(ok) reports the outcome. Without it nothing
+      authenticates the ISO, so every URL is fetched over HTTPS (see https_url)
+    - integrity: fixed-size piece hashes are kept in a manifest sidecar; resume re-checks
+      the pieces before the resume point, and a checksum mismatch re-fetches only the
+      pieces that no longer match
+    - engine: "asyncio" runs the ranged download on an event loop (aio_download) instead
+      of one thread per connection
+    - metrics: each run is written as one record to the metrics file (see new_run_metrics)
+    Returns True on success, False on failure, checksum mismatch or cancelled.
     """
-    headers = {}
-    # if file exists, attempt resume
-    try:
-        existing = os.path.getsize(filename) if os.path.exists(filename) else 0
-    except Exception:
-        existing = 0
+    if not expected_sha256:
+        iso_url = https_url(iso_url)
+        sources = [https_url(u) for u in sources or []]
+        fallbacks = [https_url(u) for u in fallbacks or []]
+    sources = [u for u in (sources or []) if u != iso_url]
+    fallbacks = [u for u in (fallbacks or []) if u != iso_url and u not in sources]
+    verified = []
+    ok = None
+    run = new_run_metrics(os.path.basename(filename), engine)
+    # a mirror that failed an earlier run (e.g. before Pause/Resume) gets a fresh chance
+    reset_breakers()
+
+    def report(downloaded, total, speed):
+        metrics_sample(run, downloaded)
+        if progress_callback:
+            progress_callback(downloaded, total, speed)
 
-    for attempt in range(retries):
+    state = _load_state(filename)
+    # an unfinished segmented download is always continued segment-wise
+    if connections > 1 or sources or state.get("segments"):
+        # the size comes from the first mirror that answers
+        started = time.time()
+        info = {"total": 0, "ranges": False}
+        for url in [iso_url] + sources + fallbacks:
+            if not mirror_available(url):
+                continue
+            info = get_remote_info(url)
+            if info["total"]:
+                break
+            mirror_failed(url)
+            metrics_mirror(run, url, error=True)
+        metrics_phase(run, "size", started)
+        total, ranges = info["total"], info["ranges"]
+        if state and total and not _same_remote(state, url, info):
+            logging.warning("%s changed on the mirror since the partial download; starting over", iso_url)
+            _discard_partial(filename)
+            state = {}
+        if ranges and total >= 2 * MIN_SEGMENT_SIZE:
+            ranged = _download_segmented
+            if engine == "asyncio":
+                ranged = lambda *a: asyncio.run(aio_download(*a))
+            run["mode"] = "segmented"
+            started = time.time()
+            ok = ranged([iso_url] + sources, filename, total,
+                        max(connections, len(sources) + 1), retries,
+                        report, stop_event, expected_sha256, verified.append, fallbacks, run)
+            metrics_phase(run, "transfer", started)
+        elif state.get("segments"):
+            if not total:
+                logging.error("Cannot reach %s to continue segmented download", iso_url)
+                finish_run_metrics(run, False)
+                return False
+            # sparse preallocated file cannot be continued by appending
+            _discard_partial(filename)
+    if ok is None:
+        run["mode"] = "stream"
+        started = time.time()
+        ok = _download_stream([iso_url] + sources + fallbacks, filename, retries, report,
+                              stop_event, expected_sha256, verified.append, run)
+        metrics_phase(run, "transfer", started)
+
+    if verified and not verified[0]:
+        logging.warning("Checksum mismatch for %s; checking pieces against the manifest", filename)
+        started = time.time()
+        ok = repair_pieces([iso_url] + sources + fallbacks, filename, expected_sha256)
+        metrics_phase(run, "repair", started)
+        verified = [ok]
+    if ok and not (stop_event and stop_event.is_set()):
+        _clear_manifest(filename)
+    if verified and verify_callback:
+        try:
+            verify_callback(verified[0])
+        except Exception:
+            pass
+    log_session_stats()
+    finish_run_metrics(run, ok, verified[0] if verified else None)
+    return ok
+
+def _download_stream(iso_urls, filename, retries=3, progress_callback=None, stop_event=None,
+                     expected_sha256=None, verify_callback=None, metrics=None):
+    """
+    Single-connection download, appending to a partial file via Range when possible.
+    The resume sidecar records size, source mirror and validators; a resume request
+    carries If-Range, so a mirror whose file changed sends it whole and the stale
+    partial file is replaced instead of extended.
+    iso_urls lists the same file on mirrors in ranked order: after an error the
+    download continues from the current offset on the next mirror whose circuit
+    breaker is closed, with exponential backoff between attempts. Each mirror gets
+    up to `retries` attempts; a stall switch (see watchdog_verdict) is not a failed
+    attempt. Only bytes left by an earlier run are re-checked against
+    the piece manifest; within a run the next attempt continues exactly where the
+    last one stopped, keeping the running hashes.
+    Bytes are written behind the connection by a writer thread (new_writer); the piece
+    manifest is saved at its checkpoints, and the partial file's size (the resume
+    point) is fsynced there every WRITE_SYNC_INTERVAL seconds.
+    """
+    if isinstance(iso_urls, str):
+        iso_urls = [iso_urls]
+    name = os.path.basename(iso_urls[0])
+    # the hasher lives across retries, so each attempt only hashes the bytes it fetches;
+    # bytes left by an earlier run are hashed once from disk (hashlib state cannot be saved)
+    hasher = hashlib.sha256() if expected_sha256 else None
+    hashed = 0
+    manifest = _load_manifest(filename, name)
+    state = _load_state(filename)
+    if state.get("name") != name or state.get("segments"):
+        state = {"name": name, "validators": {}}
+    known_total = state.get("total", 0) if os.path.exists(filename) else 0
+    current, failures = 0, 0  # candidate index, consecutive failed attempts
+    resume_at = None  # end of the bytes this run has checked or written itself
+    pieces = {}  # running hasher of the piece being written, kept across attempts
+    # failed attempts, and stall switches (their own budget, so two stalled mirrors
+    # cannot hand the download back and forth forever)
+    attempt, switches = 0, 0
+
+    reported = False
+    while attempt < retries * len(iso_urls):
+        if stop_event and stop_event.is_set():
+            return False
+        # next-ranked mirror that is not tripped, starting at the current one
+        usable = [i for i in range(current, current + len(iso_urls)) if mirror_available(iso_urls[i % len(iso_urls)])]
+        if not usable:
+            logging.error("No usable mirror left for %s", name)
+            break
+        current = usable[0] % len(iso_urls)
+        iso_url = iso_urls[current]
+        if resume_at is None:
+            # if file exists, attempt resume from its current end
+            try:
+                existing = os.path.getsize(filename) if os.path.exists(filename) else 0
+            except Exception:
+                existing = 0
+            if existing and manifest:
+                # never trust an earlier run's tail: resume from the last piece that still matches
+                checked = _verified_boundary(filename, manifest, 0, existing)
+                if checked < existing:
+                    logging.info("Resume point moved back from %d to verified piece boundary %d", existing, checked)
+                    with open(filename, "r+b") as f:
+                        f.truncate(checked)
+                    existing = checked
+            resume_at = existing
+        # this run's own bytes were written by a writer that closed cleanly
+        existing = resume_at
+        writer = None
         try:
             # Use Range header to resume if file partially exists
-            if existing > 0:
-                headers["Range"] = f"bytes={existing}-"
-            with requests.get(iso_url, stream=True, timeout=15, headers=headers) as r:
+            headers = {"Range": f"bytes={existing}-", **_if_range(state, iso_url)} if existing > 0 else {}
+            with get_session().get(iso_url, stream=True, timeout=15, headers=headers) as r:
                 r.raise_for_status()
                 # determine total size
                 total = 0
@@ -538,59 +2661,738 @@ def download_iso(iso_url, filename, lang="en", retries=3, progress_callback=None
                         total = 0
                 else:
                     total = int(r.headers.get("content-length", 0))
+                    if existing and "If-Range" in headers:
+                        # validators no longer match: the partial file belongs to an older file
+                        logging.warning("%s changed since the partial download; starting over", iso_url)
+                        known_total = 0
+                    elif existing and len(usable) > 1:
+                        raise IOError("mirror ignores Range; keeping the partial file for another mirror")
                     if existing:
                         # server didn't support Range; we'll re-download full file
                         existing = 0
+                if known_total and total and total != known_total:
+                    raise IOError(f"mirror serves a different file size ({total} != {known_total})")
+                known_total = total or known_total
+                if r.status_code != 206:
+                    state["validators"] = {}
+                state["total"] = total
+                _remember_validators(state, iso_url, r.headers)
+                _save_state(filename, state)
 
                 mode = "ab" if existing and (r.status_code == 206) else "wb"
                 downloaded = existing
+                if hasher:
+                    if mode == "wb":
+                        hasher, hashed = hashlib.sha256(), 0
+                    elif hashed < existing:
+                        hashed = _hash_file_range(hasher, filename, hashed, existing)
+                if total and (mode == "wb" or not manifest or manifest["total"] != total):
+                    manifest = _new_manifest(name, total)
+                    pieces = {}
+                ttfb = r.elapsed.total_seconds()
                 start_time = time.time()
                 last_time = start_time
                 last_downloaded = downloaded
+                watchdog, switch_to = new_watchdog(iso_url), None
 
-                # if callback provided, initialize
-                if progress_callback:
+                # if callback provided, initialize (once: mirror switches continue the same progress)
+                if progress_callback and not reported:
+                    reported = True
                     try:
                         progress_callback(downloaded, total, 0.0)
                     except Exception:
                         pass
 
-                with open(filename, mode) as f:
-                    for chunk in r.iter_content(chunk_size=131072):
+                writer = new_writer(filename, truncate=mode == "wb")
+                try:
+                    for chunk in _iter_body(r, writer):
                         if stop_event and stop_event.is_set():
                             logging.info("Download cancelled by user")
                             return False
                         if chunk:
-                            f.write(chunk)
+                            # hashed before writer_put: the buffer belongs to the writer after it
+                            if manifest:
+                                _feed_pieces(manifest, pieces, downloaded, chunk)
+                            if hasher:
+                                hasher.update(chunk)
+                                hashed += len(chunk)
+                            writer_put(writer, downloaded, chunk)
                             downloaded += len(chunk)
                             now = time.time()
+                            watchdog_feed(watchdog, downloaded - existing, now)
+                            if switches < retries * len(iso_urls):
+                                switch_to = watchdog_verdict(watchdog, iso_urls, now)
+                            if switch_to:
+                                break
                             elapsed = now - last_time
                             if elapsed >= 0.5:
                                 speed = (downloaded - last_downloaded) / (now - last_time)
                                 last_time = now
                                 last_downloaded = downloaded
+                                if not writer["pending"]:
+                                    save = manifest and functools.partial(
+                                        _save_manifest, filename, json.loads(json.dumps(manifest)))
+                                    writer_checkpoint(writer, save or None)
                                 if progress_callback:
                                     try:
                                         progress_callback(downloaded, total, speed)
                                     except Exception:
                                         pass
+                finally:
+                    stored = writer_close(writer)
+                    metrics_writer(metrics, writer)
+                    if stored:
+                        resume_at = downloaded
+                        if manifest:
+                            _save_manifest(filename, manifest)
+                    if downloaded > existing:
+                        failures = 0  # progress was made, so backoff starts over
+                    metrics_mirror(metrics, iso_url, downloaded - existing, time.time() - start_time, ttfb)
+                if not stored:
+                    raise writer["error"]
+                if switch_to:
+                    # the rest of the file comes from the better mirror, from this offset
+                    current = iso_urls.index(switch_to)
+                    switches += 1
+                    metrics_failover(metrics, switch_to)
+                    continue
+                if total and downloaded < total:
+                    raise IOError(f"connection closed at {downloaded}/{total} bytes")
                 # final callback
                 if progress_callback:
                     try:
                         progress_callback(downloaded, total, 0.0)
                     except Exception:
                         pass
-            logging.info("Download completed: %s", filename)
+            elapsed = time.time() - start_time
+            _clear_state(filename)
+            mirror_succeeded(iso_url)
+            if elapsed > 0:
+                record_mirror_sample(iso_url, (downloaded - existing) / elapsed, ttfb, weight=0.5)
+                save_mirror_stats()
+            logging.info("Download completed: %s from %s", filename, iso_url)
+            if hasher:
+                return _check_digest(hasher, expected_sha256, filename, verify_callback)
             return True
         except Exception as e:
-            logging.exception("download_iso attempt %d failed", attempt + 1)
-            time.sleep(1)
+            if writer and writer["error"]:
+                # the disk failed, not the mirror: keep what was written for a later resume
+                logging.error("Writing %s failed: %s", filename, writer["error"])
+                break
+            logging.exception("download_iso attempt %d on %s failed", attempt + 1, iso_url)
+            record_mirror_sample(iso_url, ok=False)
+            metrics_mirror(metrics, iso_url, error=True)
+            mirror_failed(iso_url)
+            # fail over: the next attempt continues from the current offset on the next mirror
+            current = (current + 1) % len(iso_urls)
+            if len(iso_urls) > 1:
+                metrics_failover(metrics, iso_urls[current])
+            _pause(backoff_delay(failures), stop_event)
+            failures += 1
+            attempt += 1
+    save_mirror_stats()
     return False
 
+# -----------------------
+# Piece manifest (integrity of partial files)
+# -----------------------
+PIECE_SIZE = 4 * 1024 * 1024
+
+def _manifest_path(filename):
+    """Path of the JSON sidecar holding per-piece SHA-256 hashes of filename."""
+    return filename + ".pieces.json"
+
+def _new_manifest(name, total, piece_size=PIECE_SIZE):
+    """Empty manifest for a file of total bytes; hashes[i] stays None until piece i is written."""
+    return {"name": name, "total": total, "piece_size": piece_size,
+            "hashes": [None] * math.ceil(total / piece_size)}
+
+def _load_manifest(filename, name=None):
+    """Manifest for filename, or None when missing, unreadable or for a different file name."""
+    try:
+        path = _manifest_path(filename)
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+            if name is None or manifest.get("name") == name:
+                return manifest
+    except Exception:
+        logging.exception("Failed loading piece manifest for %s", filename)
+    return None
+
+def _save_manifest(filename, manifest):
+    """Atomically write the piece manifest next to filename."""
+    path = _manifest_path(filename)
+    try:
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(manifest, f)
+        os.replace(path + ".tmp", path)
+    except Exception:
+        logging.exception("Failed saving piece manifest for %s", filename)
+
+def _clear_manifest(filename):
+    """Remove the piece manifest of a finished download."""
+    try:
+        os.remove(_manifest_path(filename))
+    except FileNotFoundError:
+        pass
+    except Exception:
+        logging.exception("Failed removing piece manifest for %s", filename)
+
+def _feed_pieces(manifest, running, offset, data):
+    """
+    Hash data written at offset into the manifest's piece hashes.
+    running carries the open piece between calls ({"index", "hasher"}); a piece is
+    recorded once its last byte is fed. Data starting mid-piece without a running
+    hasher leaves that piece unrecorded.
+    """
+    size, total = manifest["piece_size"], manifest["total"]
+    view = memoryview(data)
+    while view:
+        idx = offset // size
+        piece_end = min((idx + 1) * size, total)
+        n = min(len(view), piece_end - offset)
+        if running.get("index") != idx:
+            running.clear()
+            if offset % size == 0:
+                running["index"], running["hasher"] = idx, hashlib.sha256()
+        if running:
+            running["hasher"].update(view[:n])
+        offset += n
+        view = view[n:]
+        if offset == piece_end and running:
+            manifest["hashes"][idx] = running["hasher"].hexdigest()
+            running.clear()
+
+def _hash_piece(filename, start, end):
+    """SHA-256 hex digest of bytes [start, end) of filename."""
+    hasher = hashlib.sha256()
+    _hash_file_range(hasher, filename, start, end)
+    return hasher.hexdigest()
+
+def _verified_boundary(filename, manifest, start, pos):
+    """
+    Walk back from pos to the nearest piece boundary (not below start) whose preceding
+    piece on disk matches the manifest. Only pieces at the resume point are read.
+    """
+    size = manifest["piece_size"]
+    if pos < manifest["total"]:
+        pos -= pos % size
+    while pos > start:
+        idx = (pos - 1) // size
+        piece_start = max(idx * size, start)
+        expected = manifest["hashes"][idx] if idx < len(manifest["hashes"]) else None
+        if expected and piece_start == idx * size and _hash_piece(filename, piece_start, pos) == expected:
+            break
+        pos = piece_start
+    return pos
+
+@profiled("verify")
+def repair_pieces(iso_urls, filename, expected_sha256=None):
+    """
+    After a checksum failure: re-hash pieces on disk, re-fetch only those that do not
+    match the manifest (or were never recorded) with Range requests, then re-check the
+    whole-file SHA-256. Returns True when the file verifies afterwards.
+    """
+    manifest = _load_manifest(filename)
+    if not manifest:
+        logging.error("No piece manifest for %s; a full re-download is needed", filename)
+        return False
+    size, total = manifest["piece_size"], manifest["total"]
+    bad = [i for i, expected in enumerate(manifest["hashes"])
+           if expected is None or _hash_piece(filename, i * size, min((i + 1) * size, total)) != expected]
+    if not bad:
+        logging.error("All pieces of %s match the manifest; the mirror served bad data", filename)
+        return False
+    logging.info("Re-fetching %d of %d pieces of %s", len(bad), len(manifest["hashes"]), filename)
+    with open(filename, "r+b") as f:
+        for i in bad:
+            start, end = i * size, min((i + 1) * size, total)
+            for url in [u for u in iso_urls if mirror_available(u)]:
+                try:
+                    r = get_session().get(url, timeout=15, headers={"Range": f"bytes={start}-{end - 1}"})
+                    r.raise_for_status()
+                    if r.status_code != 206 or len(r.content) != end - start:
+                        raise IOError("unexpected Range response")
+                    digest = hashlib.sha256(r.content).hexdigest()
+                    if manifest["hashes"][i] and digest != manifest["hashes"][i]:
+                        raise IOError("piece does not match manifest")
+                    f.seek(start)
+                    f.write(r.content)
+                    manifest["hashes"][i] = digest
+                    break
+                except Exception:
+                    logging.exception("Repair of piece %d from %s failed", i, url)
+            else:
+                _save_manifest(filename, manifest)
+                return False
+    _save_manifest(filename, manifest)
+    if not expected_sha256:
+        return True
+    hasher = hashlib.sha256()
+    _hash_file_range(hasher, filename, 0, total)
+    return _check_digest(hasher, expected_sha256, filename)
+
 # -----------------------
 # Checksum (optional)
 # -----------------------
-# verify_checksum removed — checksum verification feature removed
+# bytes the segmented downloader hashes per progress tick while catching up
+HASH_STEP_BYTES = 64 * 1024 * 1024
+
+def get_expected_sha256(mirror_url, iso_filename):
+    """
+    Hex SHA-256 listed for iso_filename: from the cached release record when it covers
+    the file, otherwise from the mirror's sha256sums.txt.
+    """
+    release = cached_release()
+    if release and iso_filename in release["sums"]:
+        return release["sums"][iso_filename]
+    try:
+        resp = get_session().get(get_checksum_url(mirror_url), timeout=10)
+        resp.raise_for_status()
+        return parse_sha256sums(resp.text).get(iso_filename)
+    except Exception:
+        logging.exception("get_expected_sha256 failed for %s", mirror_url)
+    return None
+
+@profiled("verify")
+def _hash_file_range(hasher, filename, start, end, block=1024 * 1024):
+    """Feed bytes [start, end) of filename into hasher; returns the offset reached."""
+    with open(filename, "rb") as f:
+        f.seek(start)
+        while start < end:
+            data = f.read(min(block, end - start))
+            if not data:
+                break
+            hasher.update(data)
+            start += len(data)
+    return start
+
+def _check_digest(hasher, expected_sha256, filename, verify_callback=None):
+    """Compare the streamed digest with the published one; report via verify_callback(ok)."""
+    ok = hasher.hexdigest() == expected_sha256.lower()
+    if ok:
+        logging.info("Checksum OK: %s", filename)
+    else:
+        logging.error("Checksum mismatch for %s: got %s, expected %s", filename, hasher.hexdigest(), expected_sha256)
+    if verify_callback:
+        try:
+            verify_callback(ok)
+        except Exception:
+            pass
+    return ok
+
+# -----------------------
+# Asyncio engine (probing, discovery, ranged download)
+# -----------------------
+# Everything here runs on one event loop with the stdlib's asyncio streams and a
+# minimal HTTP/1.1 client, so hundreds of probes or connections cost tasks instead of
+# threads. Probe results, the resume sidecar and the piece manifest have the same
+# shape as in the threaded code; the sync entry points are _probe_concurrently,
+# get_release, _discover_iso_filename and download_iso with engine="asyncio".
+AIO_READ_SIZE = 131072
+# work unit pulled from the shared queue by download tasks
+AIO_SEGMENT_SIZE = 4 * PIECE_SIZE
+_REDIRECTS = (301, 302, 303, 307, 308)
+
+async def _aio_pause(seconds, stop_event=None):
+    """asyncio.sleep that returns early when stop_event (a threading.Event) is set."""
+    until = time.monotonic() + seconds
+    while not (stop_event and stop_event.is_set()):
+        left = until - time.monotonic()
+        if left <= 0:
+            return
+        await asyncio.sleep(min(left, 0.1) if stop_event else left)
+
+async def _aio_open(url, timeout):
+    """Open a stream to url's host, timing each setup phase. Returns (reader, writer, phases)."""
+    parts = urllib.parse.urlsplit(url)
+    if parts.scheme not in ("http", "https"):
+        raise ValueError(f"cannot fetch {parts.scheme} URL over HTTP")
+    https = parts.scheme == "https"
+    host, port = parts.hostname, parts.port or (443 if https else 80)
+    loop = asyncio.get_running_loop()
+    t0 = time.perf_counter()
+    infos = await asyncio.wait_for(loop.getaddrinfo(host, port, type=socket.SOCK_STREAM), timeout)
+    addr = infos[0][4]
+    t1 = time.perf_counter()
+    if https and not hasattr(asyncio.StreamWriter, "start_tls"):
+        # before Python 3.11 the handshake cannot be timed apart from the TCP connect
+        reader, writer = await asyncio.wait_for(asyncio.open_connection(
+            addr[0], addr[1], ssl=ssl.create_default_context(), server_hostname=host), timeout)
+        return reader, writer, {"dns": t1 - t0, "tcp": time.perf_counter() - t1, "tls": 0.0}
+    reader, writer = await asyncio.wait_for(asyncio.open_connection(addr[0], addr[1]), timeout)
+    t2 = time.perf_counter()
+    if https:
+        await asyncio.wait_for(writer.start_tls(ssl.create_default_context(), server_hostname=host), timeout)
+    t3 = time.perf_counter()
+    return reader, writer, {"dns": t1 - t0, "tcp": t2 - t1, "tls": t3 - t2}
+
+async def _aio_close(writer):
+    writer.close()
+    try:
+        await writer.wait_closed()
+    except Exception:
+        pass
+
+async def _aio_request(url, headers=None, timeout=10, max_redirects=3):
+    """
+    GET url over a fresh connection (HTTP/1.1, Connection: close), following redirects.
+    Returns a dict {"url", "status", "headers" (lower-case names), "reader", "writer",
+    "phases", "ttfb"}; read the body with _aio_body and close with _aio_close(resp["writer"]).
+    """
+    for _redirect in range(max_redirects + 1):
+        reader, writer, phases = await _aio_open(url, timeout)
+        try:
+            parts = urllib.parse.urlsplit(url)
+            path = (parts.path or "/") + (f"?{parts.query}" if parts.query else "")
+            lines = [f"GET {path} HTTP/1.1", f"Host: {parts.netloc}", f"User-Agent: {USER_AGENT}",
+                     "Accept-Encoding: identity", "Connection: close"]
+            lines += [f"{k}: {v}" for k, v in (headers or {}).items()]
+            writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1"))
+            sent = time.perf_counter()
+            await writer.drain()
+            status_line = await asyncio.wait_for(reader.readline(), timeout)
+            ttfb = time.perf_counter() - sent
+            fields = status_line.split(None, 2)
+            if len(fields) < 2 or not fields[0].startswith(b"HTTP/"):
+                raise IOError(f"bad status line from {url}: {status_line[:80]!r}")
+            status = int(fields[1])
+            resp_headers = {}
+            while True:
+                line = await asyncio.wait_for(reader.readline(), timeout)
+                if line in (b"\r\n", b"\n", b""):
+                    break
+                key, _sep, value = line.decode("latin-1").partition(":")
+                resp_headers[key.strip().lower()] = value.strip()
+        except BaseException:
+            await _aio_close(writer)
+            raise
+        if status in _REDIRECTS and resp_headers.get("location"):
+            await _aio_close(writer)
+            url = urllib.parse.urljoin(url, resp_headers["location"])
+            continue
+        return {"url": url, "status": status, "headers": resp_headers, "reader": reader,
+                "writer": writer, "phases": phases, "ttfb": ttfb}
+    raise IOError(f"too many redirects for {url}")
+
+async def _aio_body(resp, timeout=15, chunk_size=AIO_READ_SIZE):
+    """Yield the response body in chunks (Content-Length, chunked, or until the server closes)."""
+    reader, headers = resp["reader"], resp["headers"]
+    if "chunked" in headers.get("transfer-encoding", "").lower():
+        while True:
+            size = int((await asyncio.wait_for(reader.readline(), timeout)).split(b";")[0].strip() or b"0", 16)
+            if size == 0:
+                return
+            while size:
+                data = await asyncio.wait_for(reader.read(min(chunk_size, size)), timeout)
+                if not data:
+                    raise IOError("connection closed inside a chunk")
+                size -= len(data)
+                yield data
+            await asyncio.wait_for(reader.readline(), timeout)
+    length = int(headers["content-length"]) if "content-length" in headers else None
+    received = 0
+    while length is None or received < length:
+        want = chunk_size if length is None else min(chunk_size, length - received)
+        data = await asyncio.wait_for(reader.read(want), timeout)
+        if not data:
+            if length is not None:
+                raise IOError(f"connection closed after {received}/{length} bytes")
+            return
+        received += len(data)
+        yield data
+
+async def aio_fetch_text(url, timeout=10):
+    """Body of url as text, or None on any error."""
+    resp = None
+    try:
+        resp = await _aio_request(url, timeout=timeout)
+        if resp["status"] != 200:
+            raise IOError(f"HTTP {resp['status']}")
+        return b"".join([chunk async for chunk in _aio_body(resp, timeout)]).decode("utf-8", "replace")
+    except Exception as e:
+        logging.debug("aio fetch of %s failed: %s", url, e)
+        return None
+    finally:
+        if resp:
+            await _aio_close(resp["writer"])
+
+async def aio_get_release(mirror_urls, timeout=10):
+    """Read sha256sums.txt from every mirror URL at once; the newest release record wins."""
+    async def one(url):
+        url = get_checksum_url(url)
+        text = await aio_fetch_text(url, timeout)
+        return _release_from_sums(text, url) if text else None
+    return _newest_release(await asyncio.gather(*(one(u) for u in mirror_urls)))
+
+async def aio_probe_mirror(mirror_url, iso_filename, probe_bytes=PROBE_BYTES, timeout=5):
+    """Async probe_mirror: same measurements and result dict."""
+    result = {"url": mirror_url, "ok": False, "dns": 0.0, "tcp": 0.0, "tls": 0.0, "connect": 0.0,
+              "ttfb": 0.0, "throughput": 0.0, "samples": [], "bytes": 0, "total": 0}
+    resp = None
+    try:
+        resp = await _aio_request(mirror_iso_url(mirror_url, iso_filename),
+                                  {"Range": f"bytes=0-{probe_bytes - 1}"}, timeout)
+        result.update(resp["phases"])
+        result["connect"] = sum(resp["phases"].values())
+        result["ttfb"] = resp["ttfb"]
+        if resp["status"] not in (200, 206):
+            raise IOError(f"HTTP {resp['status']}")
+        content_range = resp["headers"].get("content-range")
+        if content_range:
+            result["total"] = int(content_range.split("/")[-1])
+        else:
+            result["total"] = int(resp["headers"].get("content-length") or 0)
+        received = 0
+        marks = []
+        read_size = min(65536, max(4096, probe_bytes // 16))
+        async for chunk in _aio_body(resp, timeout, read_size):
+            received += len(chunk)
+            marks.append((time.perf_counter(), received))
+            if received >= probe_bytes:
+                break
+        _finish_probe(result, marks, read_size)
+        if result["ok"]:
+            mirror_succeeded(mirror_url)
+    except Exception as e:
+        logging.debug("aio probe of %s failed: %s", mirror_url, e)
+    finally:
+        if resp:
+            await _aio_close(resp["writer"])
+    return result
+
+async def aio_probe_all(mirrors, iso_filename, probe_bytes, concurrency=PROBE_WORKERS,
+                        deadline=PROBE_DEADLINE, on_probe=None):
+    """
+    Probe every mirror with at most `concurrency` probes in flight. on_probe(probe, mirror)
+    is called as each finishes; probes still running at `deadline` are cancelled.
+    Returns the finished (probe, mirror) pairs.
+    """
+    done = []
+    gate = asyncio.Semaphore(max(1, concurrency))
+
+    async def one(mirror):
+        async with gate:
+            return await aio_probe_mirror(mirror.url, iso_filename, probe_bytes), mirror
+
+    tasks = [asyncio.ensure_future(one(m)) for m in mirrors]
+    try:
+        for fut in asyncio.as_completed(tasks, timeout=deadline):
+            probe, mirror = await fut
+            done.append((probe, mirror))
+            if on_probe:
+                on_probe(probe, mirror)
+    except asyncio.TimeoutError:
+        logging.info("Probe deadline reached: %d/%d probes finished", len(done), len(mirrors))
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+    return done
+
+async def aio_download(iso_urls, filename, total, connections=DEFAULT_CONNECTIONS, retries=3,
+                       progress_callback=None, stop_event=None, expected_sha256=None, verify_callback=None,
+                       fallbacks=None, metrics=None):
+    """
+    Event-loop counterpart of _download_segmented, same arguments and result.
+    The file is cut into AIO_SEGMENT_SIZE work units in one queue; `connections` tasks,
+    spread over iso_urls, pull units until none are left, so faster mirrors simply take
+    more of them. A mirror that keeps failing puts its unit back for the others and its
+    tasks fail over to the next unused mirror in fallbacks.
+    Progress, resume sidecar, piece manifest, the write-behind writer and the running
+    SHA-256 work as in the threaded path (hashing, and waiting for a full writer, run
+    in the default executor so the loop keeps reading).
+    """
+    if isinstance(iso_urls, str):
+        iso_urls = [iso_urls]
+    loop = asyncio.get_running_loop()
+    state, manifest = await loop.run_in_executor(
+        None, _prepare_segments, filename, os.path.basename(iso_urls[0]), total, connections, AIO_SEGMENT_SIZE)
+    segments = state["segments"]
+    writer = new_writer(filename)
+    written = {"segments": json.loads(json.dumps(segments))}
+    todo = collections.deque(seg for seg in segments if seg["pos"] < seg["end"])
+    busy = set()
+    spare = collections.deque(u for u in (fallbacks or []) if u not in iso_urls)
+    candidates = list(iso_urls) + list(spare)
+    bytes_by_url = collections.defaultdict(int)
+    secs_by_url = collections.defaultdict(float)
+    ttfb_by_url = {}
+
+    def stopped():
+        return bool(stop_event and stop_event.is_set())
+
+    async def fetch(me, seg):
+        pieces = {}
+        attempt = 0
+        while attempt < retries:
+            url, started = me["url"], None
+            if stopped():
+                return False
+            resp = None
+            try:
+                headers = {"Range": f"bytes={seg['pos']}-{seg['end'] - 1}", **_if_range(state, url)}
+                resp = await _aio_request(url, headers, 15)
+                if resp["status"] != 206:
+                    raise IOError("remote file changed (If-Range)" if "If-Range" in headers
+                                  else "server ignored Range request")
+                if int(resp["headers"].get("content-range", "/0").split("/")[-1]) != total:
+                    raise IOError("mirror serves a different file size")
+                _remember_validators(state, url, resp["headers"])
+                ttfb_by_url[url] = resp["ttfb"]
+                metrics_mirror(metrics, url, phases=resp["phases"])
+                started, received = time.time(), 0
+                watchdog, switch_to = new_watchdog(url), None
+                async for chunk in _aio_body(resp):
+                    if stopped():
+                        return False
+                    chunk = chunk[:seg["end"] - seg["pos"]]
+                    queued = writer_put(writer, seg["pos"], chunk, block=False)
+                    if queued < len(chunk):
+                        # every buffer is in flight: wait for the disk off the loop
+                        await loop.run_in_executor(None, writer_put, writer, seg["pos"] + queued,
+                                                   memoryview(chunk)[queued:])
+                    _feed_pieces(manifest, pieces, seg["pos"], chunk)
+                    seg["pos"] += len(chunk)
+                    bytes_by_url[url] += len(chunk)
+                    received += len(chunk)
+                    if seg["pos"] >= seg["end"]:
+                        break
+                    watchdog_feed(watchdog, received)
+                    switch_to = watchdog_verdict(watchdog, candidates)
+                    if switch_to:
+                        break
+                secs_by_url[url] += time.time() - started
+                if seg["pos"] >= seg["end"]:
+                    mirror_succeeded(url)
+                    return True
+                if switch_to:
+                    me["url"] = switch_to
+                    metrics_failover(metrics, switch_to)
+                    continue
+            except Exception:
+                if writer["error"]:
+                    return False  # the disk failed, not the mirror
+                logging.exception("segment %d-%d from %s attempt %d failed", seg["start"], seg["end"], url, attempt + 1)
+                record_mirror_sample(url, ok=False)
+                # the failed attempt's bytes are in bytes_by_url; its time is added here
+                metrics_mirror(metrics, url, seconds=time.time() - started if started else 0.0, error=True)
+                if mirror_failed(url):
+                    return False
+                await _aio_pause(backoff_delay(attempt), stop_event)
+            finally:
+                if resp:
+                    await _aio_close(resp["writer"])
+            attempt += 1
+        return False
+
+    async def worker(url):
+        me = {"url": url}
+        while not stopped():
+            if not todo:
+                if not busy:
+                    return
+                # units held by other tasks come back if their mirror fails
+                await asyncio.sleep(0.2)
+                continue
+            seg = todo.popleft()
+            busy.add(id(seg))
+            ok = await fetch(me, seg)
+            busy.discard(id(seg))
+            if not ok:
+                if seg["pos"] < seg["end"]:
+                    todo.append(seg)
+                if stopped() or writer["error"]:
+                    return
+                url = None
+                while spare and url is None:
+                    url = spare.popleft()
+                    url = url if mirror_available(url) else None
+                if url is None:
+                    return
+                logging.info("Failing over to %s", url)
+                metrics_failover(metrics, url)
+                me["url"] = url
+
+    def done_bytes():
+        return sum(seg["pos"] - seg["start"] for seg in segments)
+
+    hasher = hashlib.sha256() if expected_sha256 else None
+    hashed = 0
+
+    def contiguous_prefix():
+        for seg in sorted(written["segments"], key=lambda x: x["start"]):
+            if seg["pos"] < seg["end"]:
+                return seg["pos"]
+        return total
+
+    def checkpoint():
+        if writer["pending"]:
+            return
+        snapshot, pieces = json.loads(json.dumps(state)), json.loads(json.dumps(manifest))
+
+        def save():
+            _save_state(filename, snapshot)
+            _save_manifest(filename, pieces)
+            written["segments"] = snapshot["segments"]
+        writer_checkpoint(writer, save)
+
+    def report(speed):
+        if progress_callback:
+            try:
+                progress_callback(done_bytes(), total, speed)
+            except Exception:
+                pass
+
+    per_url = max(1, connections // len(iso_urls))
+    urls = [url for url in iso_urls if mirror_available(url)] or iso_urls[:1]
+    tasks = [asyncio.ensure_future(worker(url)) for url in urls for _ in range(per_url)]
+    last_time, last_downloaded = time.time(), done_bytes()
+    report(0.0)
+    while not all(t.done() for t in tasks):
+        await asyncio.wait(tasks, timeout=0.5)
+        now, downloaded = time.time(), done_bytes()
+        speed = (downloaded - last_downloaded) / (now - last_time) if now > last_time else 0.0
+        last_time, last_downloaded = now, downloaded
+        checkpoint()
+        if hasher:
+            end = min(contiguous_prefix(), hashed + HASH_STEP_BYTES)
+            if end > hashed:
+                hashed = await loop.run_in_executor(None, _hash_file_range, hasher, filename, hashed, end)
+        report(speed)
+    for t in tasks:
+        if t.exception():
+            logging.error("download task failed: %r", t.exception())
+
+    if await loop.run_in_executor(None, writer_close, writer):
+        _save_state(filename, state)
+        _save_manifest(filename, manifest)
+    else:
+        logging.error("Writing %s failed: %s", filename, writer["error"])
+    metrics_writer(metrics, writer)
+    downloaded = done_bytes()
+    report(0.0)
+    for url, count in bytes_by_url.items():
+        logging.info("Fetched %d bytes from %s", count, url)
+        metrics_mirror(metrics, url, count, secs_by_url[url], ttfb_by_url.get(url))
+        if count and secs_by_url[url] > 0:
+            record_mirror_sample(url, count / secs_by_url[url], ttfb_by_url.get(url), weight=0.5)
+    save_mirror_stats()
+    if stopped():
+        logging.info("Download cancelled by user")
+        return False
+    if writer["error"]:
+        return False
+    if downloaded < total:
+        logging.error("Async download incomplete: %d/%d bytes", downloaded, total)
+        return False
+    _clear_state(filename)
+    logging.info("Download completed: %s (%d tasks, %d mirrors, asyncio)", filename, len(tasks), len(bytes_by_url))
+    if hasher:
+        hashed = _hash_file_range(hasher, filename, hashed, total)
+        return _check_digest(hasher, expected_sha256, filename, verify_callback)
+    return True
 
 # -----------------------
 # History & misc utils
@@ -605,12 +3407,399 @@ def open_folder(path):
     except Exception:
         logging.exception("open_folder failed")
 
+# -----------------------
+# Benchmarks
+# -----------------------
+def _measure(fn):
+    """
+    Run fn twice: once timed, once under tracemalloc (which slows allocation-heavy code).
+    Returns (result, seconds, peak_traced_bytes).
+    """
+    start = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return result, elapsed, peak
+
+def benchmark_status_parse(path=None, country="US"):
+    """Compare json.load + filter (the old get_mirrors path) with the streaming parser."""
+    path = path or fetch_mirror_status()
+    if not path:
+        raise RuntimeError("no mirror status document available")
+
+    def full_load():
+        with open(path, "r", encoding="utf-8") as f:
+            doc = json.load(f)
+        return [m for m in doc.get("urls", []) if m.get("country_code") == country and m.get("active")]
+
+    report = {"document_bytes": os.path.getsize(path), "country": country}
+    for name, fn in (("json_load", full_load), ("streaming", lambda: parse_mirror_status(path, {country}))):
+        result, elapsed, peak = _measure(fn)
+        report[name] = {"seconds": round(elapsed, 4), "peak_bytes": peak, "mirrors": len(result)}
+    return report
+
+def _bench_server(size, latency=0.0, profile=None, data=None):
+    """
+    Start a local HTTP/1.1 server in a daemon thread that serves the same `size` random
+    bytes (or `data`) with Range support at every path, after `latency` seconds per request.
+    profile simulates a mirror's behaviour, a dict with any of
+    - rate: bytes/s (unthrottled when missing)
+    - latency, jitter: seconds before each response, plus up to `jitter` more at random
+    - ranges: False to ignore Range and always send the whole file
+    - die_after: drop the connection after this many body bytes of each response
+    - burst, burst_every: answer 503 to `burst` requests out of every `burst_every`
+      (just the first `burst` requests when burst_every is missing)
+    Returns (server, base_url); stop it with server.shutdown().
+    """
+    data = memoryview(data if data is not None else os.urandom(size))
+    profile = profile or {}
+    seen = [0]  # requests so far, for 5xx bursts
+    lock = threading.Lock()
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            with lock:
+                count = seen[0]
+                seen[0] += 1
+            time.sleep(profile.get("latency", latency) + random.uniform(0, profile.get("jitter", 0.0)))
+            burst, every = profile.get("burst", 0), profile.get("burst_every")
+            if burst and (count % every if every else count) < burst:
+                self.send_response(503)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            start, end = 0, size - 1
+            rng = self.headers.get("Range")
+            if rng and profile.get("ranges", True):
+                first, _sep, last = rng.split("=", 1)[1].partition("-")
+                start, end = int(first), min(int(last) if last else size - 1, size - 1)
+                self.send_response(206)
+                self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+            else:
+                self.send_response(200)
+            self.send_header("Content-Length", str(end - start + 1))
+            self.end_headers()
+            stop = end + 1
+            if profile.get("die_after"):
+                stop = min(stop, start + profile["die_after"])
+                self.close_connection = True
+            rate = profile.get("rate")
+            try:
+                sent, began = start, time.perf_counter()
+                while sent < stop:
+                    # small writes keep throttled output smooth enough for 64 KB probes
+                    n = min(16384 if rate else 1024 * 1024, stop - sent)
+                    self.wfile.write(data[sent:sent + n])
+                    sent += n
+                    if rate:
+                        ahead = began + (sent - start) / rate - time.perf_counter()
+                        if ahead > 0:
+                            time.sleep(ahead)
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+
+    class Server(http.server.ThreadingHTTPServer):
+        daemon_threads = True
+        request_queue_size = 1024  # hundreds of clients connect at once
+
+    server = Server(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+def benchmark_async(concurrency=(16, 64, 256), probes=256, probe_bytes=64 * 1024, latency=0.05,
+                    download_mb=128, connections=16):
+    """
+    Threaded vs asyncio engine against a local server with artificial latency:
+    - `probes` Range probes at each concurrency level (thread pool size vs task limit)
+    - one ranged download of download_mb MB over `connections` connections
+    The server runs in this process, so both engines share the CPU with it.
+    """
+    name = "bench.iso"
+    size = download_mb * 1024 * 1024
+    server, base = _bench_server(size, latency)
+    mirrors = [Mirror(f"{base}/m{i}/", "http", "", 0.0, 0, 1.0, 0.0) for i in range(probes)]
+    report = {"probes": probes, "probe_bytes": probe_bytes, "latency": latency, "probe": {}, "download": {}}
+    try:
+        for limit in concurrency:
+            def threaded(limit=limit):
+                with ThreadPoolExecutor(max_workers=limit) as pool:
+                    return list(pool.map(lambda m: probe_mirror(m.url, name, probe_bytes, timeout=30), mirrors))
+
+            def evented(limit=limit):
+                return [p for p, _ in asyncio.run(aio_probe_all(mirrors, name, probe_bytes, limit, deadline=300))]
+
+            for engine, fn in (("threads", threaded), ("asyncio", evented)):
+                result, elapsed, peak = _measure(fn)
+                report["probe"][f"{engine}@{limit}"] = {"seconds": round(elapsed, 3), "peak_bytes": peak,
+                                                        "ok": sum(1 for p in result if p["ok"])}
+        with tempfile.TemporaryDirectory() as tmp:
+            target = os.path.join(tmp, name)
+            url = mirror_iso_url(mirrors[0].url, name)
+            engines = (("threads", lambda: _download_segmented(url, target, size, connections)),
+                       ("asyncio", lambda: asyncio.run(aio_download(url, target, size, connections))))
+            for engine, fn in engines:
+                def fresh(fn=fn):
+                    for path in (target, _state_path(target), _manifest_path(target)):
+                        if os.path.exists(path):
+                            os.remove(path)
+                    return fn()
+                ok, elapsed, peak = _measure(fresh)
+                report["download"][f"{engine}@{connections}"] = {
+                    "seconds": round(elapsed, 3), "peak_bytes": peak, "ok": ok,
+                    "mb_s": round(download_mb / elapsed, 1) if elapsed > 0 else 0.0}
+    finally:
+        server.shutdown()
+        server.server_close()
+        forget_mirrors(base)
+    return report
+
+def _serve_bench_mirrors(size, profiles, seed, conn):
+    """
+    Child-process side of benchmark_mirrors: one server per profile over the same seeded
+    random data; sends ([base_url, ...], sha256 of the data) over conn, then runs until
+    conn receives anything. A separate process keeps the servers' CPU time out of the
+    measurement.
+    """
+    rng, block = random.Random(seed), 1024 * 1024
+    # built a block at a time: one getrandbits call is limited to 2**31 bits
+    data = b"".join(rng.getrandbits(min(block, size - i) * 8).to_bytes(min(block, size - i), "little")
+                    for i in range(0, size, block))
+    servers = [_bench_server(size, profile=profile, data=data) for profile in profiles]
+    conn.send(([base for _server, base in servers], hashlib.sha256(data).hexdigest()))
+    try:
+        conn.recv()
+    except EOFError:
+        pass
+    for server, _base in servers:
+        server.shutdown()
+
+def _peak_rss():
+    """Peak resident set size of this process in bytes, or None where unavailable."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+# simulated mirror sets for benchmark_mirrors (see _bench_server for the profile keys);
+# the first mirror is always the fastest by rate, and each set impairs it differently
+MB = 1024 * 1024
+BENCH_SCENARIOS = {
+    "clean": [{"rate": 24 * MB, "latency": 0.02}, {"rate": 4 * MB}, {"rate": 12 * MB}, {"rate": 8 * MB},
+              {"rate": 2 * MB}, {"rate": 16 * MB}],
+    "latency_jitter": [{"rate": 24 * MB, "latency": 0.15, "jitter": 0.1}, {"rate": 16 * MB, "latency": 0.02, "jitter": 0.01},
+                       {"rate": 8 * MB, "latency": 0.1, "jitter": 0.3}, {"rate": 4 * MB, "latency": 0.05}],
+    "no_range": [{"rate": 24 * MB, "ranges": False}, {"rate": 16 * MB}, {"rate": 8 * MB}, {"rate": 4 * MB}],
+    "disconnects": [{"rate": 24 * MB, "die_after": 8 * MB}, {"rate": 16 * MB, "die_after": 20 * MB},
+                    {"rate": 8 * MB}, {"rate": 4 * MB}],
+    "5xx_bursts": [{"rate": 24 * MB, "burst": 2, "burst_every": 6}, {"rate": 16 * MB, "burst": 3},
+                   {"rate": 8 * MB}, {"rate": 4 * MB}],
+}
+
+def benchmark_mirrors(scenarios=None, size_mb=64, connections=4, seed=1):
+    """
+    End-to-end runs against simulated mirrors (BENCH_SCENARIOS): a fake status document
+    goes through parse_mirror_status and prerank_mirrors, rank_mirrors_adaptive ranks
+    the survivors, and download_iso fetches and verifies a size_mb MB file with the
+    ranking as fallbacks. Per scenario it reports total, ranking and download seconds,
+    where the known-fastest mirror ended up in the ranking, client CPU seconds per GB
+    and the process's peak RSS so far.
+    """
+    scenarios = scenarios or BENCH_SCENARIOS
+    size = size_mb * MB
+    name = "bench.iso"
+    report = {"size_mb": size_mb, "connections": connections, "scenarios": {}}
+    ctx = multiprocessing.get_context("spawn")
+    for scenario, profiles in scenarios.items():
+        parent, child = ctx.Pipe()
+        server = ctx.Process(target=_serve_bench_mirrors, args=(size, profiles, seed, child), daemon=True)
+        server.start()
+        bases, sha = parent.recv()
+        try:
+            with tempfile.TemporaryDirectory() as tmp:
+                # every mirror is listed over http, https and rsync, like the real document
+                status = os.path.join(tmp, "status.json")
+                entries = [{"url": f"{proto}://{base.split('://', 1)[1]}/archlinux/", "protocol": proto,
+                            "country_code": "XX", "score": random.Random(seed + i).random(), "delay": 60,
+                            "completion_pct": 1.0, "duration_avg": 0.1, "active": True}
+                           for i, base in enumerate(bases) for proto in ("http", "https", "rsync")]
+                with open(status, "w", encoding="utf-8") as f:
+                    json.dump({"urls": entries}, f)
+                cpu, started = time.process_time(), time.perf_counter()
+                mirrors = prerank_mirrors(parse_mirror_status(status), "XX", len(profiles), prefer="http")
+                ranked = [r["mirror"] for r in rank_mirrors_adaptive(mirrors, iso_filename=name, use_history=False)]
+                ranked_at = time.perf_counter()
+                urls = [mirror_iso_url(m.url, name) for m in ranked]
+                verified = []
+                ok = download_iso(urls[0], os.path.join(tmp, name), connections=connections,
+                                  expected_sha256=sha, verify_callback=verified.append, fallbacks=urls)
+                finished = time.perf_counter()
+                cpu = time.process_time() - cpu
+            order = [bases.index(m.url.split("/archlinux/")[0]) for m in ranked]
+            fastest = max(range(len(profiles)), key=lambda i: profiles[i].get("rate", float("inf")))
+            report["scenarios"][scenario] = {
+                "seconds": round(finished - started, 3), "rank_seconds": round(ranked_at - started, 3),
+                "download_seconds": round(finished - ranked_at, 3), "ok": ok, "verified": bool(verified and verified[0]),
+                "ranking": order, "fastest": fastest,
+                "fastest_rank": order.index(fastest) + 1 if fastest in order else None,
+                "cpu_s_per_gb": round(cpu / (size / 1024 ** 3), 2), "peak_rss_bytes": _peak_rss()}
+        finally:
+            parent.send("stop")
+            server.join(5)
+            if server.is_alive():
+                server.terminate()
+            for base in bases:
+                forget_mirrors(base)
+    return report
+
+def _recv_to_file(r, target):
+    """The original loop: iter_content with 128 KB chunks and write() on the caller's thread."""
+    received = 0
+    with open(target, "wb") as f:
+        for chunk in r.iter_content(chunk_size=131072):
+            f.write(chunk)
+            received += len(chunk)
+        f.flush()
+        os.fsync(f.fileno())
+    return received
+
+def _recv_to_writer(r, target, zero_copy):
+    """read1 chunks copied into the disk writer, or readinto straight into its buffers."""
+    writer = new_writer(target, truncate=True)
+    received = 0
+    try:
+        for chunk in (_iter_body(r, writer) if zero_copy else _iter_body_copy(r)):
+            writer_put(writer, received, chunk)
+            received += len(chunk)
+    finally:
+        stored = writer_close(writer)
+    if not stored:
+        raise IOError(f"writing {target} failed")
+    return received
+
+def benchmark_recv(size_mb=256, repeats=3):
+    """
+    Receive-and-store loops against an unthrottled local server in a child process:
+    iter_content with 128 KB chunks written in place (the original loop), read1 chunks
+    copied into the disk writer (_iter_body_copy) and readinto straight into the
+    writer's buffers (_iter_body). Each run writes a file in the current directory,
+    where downloads land, and ends with an fsync; the fastest of `repeats` runs is
+    reported in MB/s and MB per CPU second (MB/s per core).
+    """
+    size = size_mb * MB
+    loops = {"iter_content": _recv_to_file,
+             "copy": functools.partial(_recv_to_writer, zero_copy=False),
+             "readinto": functools.partial(_recv_to_writer, zero_copy=True)}
+    report = {"size_mb": size_mb, "loops": {}}
+    ctx = multiprocessing.get_context("spawn")
+    parent, child = ctx.Pipe()
+    server = ctx.Process(target=_serve_bench_mirrors, args=(size, [{}], 0, child), daemon=True)
+    server.start()
+    (base,), _sha = parent.recv()
+    try:
+        with tempfile.TemporaryDirectory(dir=".") as tmp:
+            target = os.path.join(tmp, "bench.iso")
+            for name, loop in loops.items():
+                best = None
+                for _ in range(repeats):
+                    cpu, started = time.process_time(), time.perf_counter()
+                    with get_session().get(base + "/bench.iso", stream=True, timeout=30) as r:
+                        r.raise_for_status()
+                        received = loop(r, target)
+                    wall, cpu = time.perf_counter() - started, time.process_time() - cpu
+                    if received != size:
+                        raise IOError(f"{name}: received {received} of {size} bytes")
+                    if best is None or wall < best[0]:
+                        best = (wall, cpu)
+                wall, cpu = best
+                report["loops"][name] = {"seconds": round(wall, 3), "cpu_seconds": round(cpu, 3),
+                                         "mb_s": round(size_mb / wall, 1),
+                                         "mb_per_cpu_s": round(size_mb / cpu, 1) if cpu > 0 else None}
+    finally:
+        parent.send("stop")
+        server.join(5)
+        if server.is_alive():
+            server.terminate()
+    return report
+
+BENCHMARKS = {
+    "parse": benchmark_status_parse,
+    "async": benchmark_async,
+    "mirrors": benchmark_mirrors,
+    "recv": benchmark_recv,
+}
+
+# every benchmark report is appended here; a timing more than BENCH_TOLERANCE times
+# (and BENCH_MIN_DELTA seconds) worse than the previous run of the same benchmark is
+# listed under "regressions"
+BENCH_RESULTS_FILE = "arch_downloader_bench.jsonl"
+BENCH_TOLERANCE = 1.25
+BENCH_MIN_DELTA = 0.05
+
+def _bench_costs(report, prefix=""):
+    """Flatten the compared values of a report (seconds, cpu_s_per_gb) to {dotted.path: value}."""
+    costs = {}
+    for key, value in report.items():
+        if isinstance(value, dict):
+            costs.update(_bench_costs(value, f"{prefix}{key}."))
+        elif (key.endswith("seconds") or key == "cpu_s_per_gb") and isinstance(value, (int, float)):
+            costs[prefix + key] = value
+    return costs
+
+def _previous_bench(name):
+    """The last stored report of benchmark `name`, or None."""
+    previous = None
+    try:
+        if os.path.exists(BENCH_RESULTS_FILE):
+            with open(BENCH_RESULTS_FILE, "r", encoding="utf-8") as f:
+                for line in f:
+                    record = json.loads(line)
+                    if record.get("name") == name:
+                        previous = record["report"]
+    except Exception:
+        logging.exception("Failed reading %s", BENCH_RESULTS_FILE)
+    return previous
+
+def run_benchmark(name):
+    """
+    Run one named benchmark, compare it with the previous run, append it to
+    BENCH_RESULTS_FILE and print the report as JSON.
+    """
+    configure_metrics({"metrics_file": None})  # benchmark traffic stays out of the metrics
+    report = BENCHMARKS[name]()
+    previous = _previous_bench(name)
+    if previous:
+        before = _bench_costs(previous)
+        report["regressions"] = {
+            path: {"before": before[path], "after": value}
+            for path, value in _bench_costs(report).items()
+            if path in before and value > before[path] * BENCH_TOLERANCE and value - before[path] > BENCH_MIN_DELTA
+        }
+    try:
+        with open(BENCH_RESULTS_FILE, "a", encoding="utf-8") as f:
+            f.write(json.dumps({"name": name, "ts": round(time.time()), "python": sys.version.split()[0],
+                                "report": report}) + "\n")
+    except Exception:
+        logging.exception("Failed saving benchmark results")
+    print(json.dumps(report, indent=2))
+    return report
+
 # -----------------------
 # CLI entrypoint
 # -----------------------
 def main_cli(args):
     """Command-line mode: detect country, list mirrors, let user choose, download (with optional verify)."""
     cfg = load_config()
+    configure_metrics(cfg)
     lang = args.lang or cfg.get("lang", "en")
     print(_( "detecting_country", lang))
     country = get_country()
@@ -620,25 +3809,26 @@ def main_cli(args):
     print(_( "detected_country", lang).format(country))
 
     print(_( "fetching_mirrors", lang))
-    mirrors = get_mirrors(country)
+    mirrors = get_mirrors(country, prefer=preferred_protocol(cfg.get("verify", True)))
     if not mirrors:
         print(_( "no_mirrors", lang))
         sys.exit(1)
 
     print(_( "mirror_testing", lang))
-    spds = [test_mirror_speed(m["url"]) for m in mirrors]
-    sorted_pairs = sorted(zip(spds, mirrors), key=lambda x: x[0], reverse=True)
-    mirrors = [m for _, m in sorted_pairs]
+    engine = args.engine or cfg.get("engine", DEFAULT_ENGINE)
+    ranked = rank_mirrors_adaptive(mirrors, byte_budget=cfg.get("probe_budget", ADAPTIVE_BYTE_BUDGET), engine=engine)
+    spds = [r["speed"] for r in ranked]
+    mirrors = [r["mirror"] for r in ranked]
 
     for i, m in enumerate(mirrors):
-        print(f"{i+1}: {m['url']} ({m.get('protocol')}) - " + _( "mirror_speed_label", lang).format(spds[i] if i < len(spds) else 0.0))
+        print(f"{i+1}: {m.url} ({m.protocol}) - " + _( "mirror_speed_label", lang).format(spds[i] if i < len(spds) else 0.0))
 
     choice = input(_( "select_mirror", lang) + f" [1-{len(mirrors)}]: ")
     try:
         idx = int(choice) - 1
         if idx < 0 or idx >= len(mirrors):
             raise ValueError
-        mirror_url = mirrors[idx]["url"]
+        mirror_url = mirrors[idx].url
     except Exception:
         print(_( "invalid_choice", lang))
         sys.exit(1)
@@ -667,24 +3857,44 @@ def main_cli(args):
     def cb(downloaded, total, speed):
         # simple console progress
         if total:
-            pct = downloaded / total * 100
-            eta = "-"
-            if speed > 0:
-                eta_sec = (total - downloaded) / speed
-                eta = f"{int(eta_sec)}s"
-            print(f"\r{downloaded}/{total} bytes ({pct:.1f}%) speed={speed/1024/1024:.2f} MB/s ETA={eta}", end="")
-
-    ok = download_iso(iso_url, save_path, lang, progress_callback=cb, stop_event=stop_event)
+            with profile_phase("ui"):
+                pct = downloaded / total * 100
+                eta = "-"
+                if speed > 0:
+                    eta_sec = (total - downloaded) / speed
+                    eta = f"{int(eta_sec)}s"
+                print(f"\r{downloaded}/{total} bytes ({pct:.1f}%) speed={speed/1024/1024:.2f} MB/s ETA={eta}", end="")
+
+    connections = args.connections or cfg.get("connections", DEFAULT_CONNECTIONS)
+    swarm = args.swarm or cfg.get("swarm", DEFAULT_SWARM_MIRRORS)
+    # every ranked http(s) mirror is a failover candidate; the top `swarm` download at once
+    candidates = [mirror_iso_url(m.url, filename) for m in mirrors if m.protocol in ("http", "https")]
+    sources = candidates[:swarm]
+    # checksum is computed while downloading, so verifying costs no extra pass over the file
+    expected = get_expected_sha256(mirror_url, filename) if cfg.get("verify", True) else None
+    if cfg.get("verify", True) and not expected:
+        print(_( "checksum_not_found", lang))
+    verified = []
+    ok = download_iso(iso_url, save_path, lang, progress_callback=cb, stop_event=stop_event,
+                      connections=connections, sources=sources if swarm > 1 else None,
+                      expected_sha256=expected, verify_callback=verified.append, engine=engine,
+                      fallbacks=candidates)
     print()
+    if verified:
+        print(_( "checksum_ok" if verified[0] else "checksum_fail", lang))
     if ok:
         # open folder button enabled
         print(_( "download_complete", lang).format(os.path.basename(save_path)))
-    else:
+    elif not verified:
         print(_( "download_failed", lang))
 
 # -----------------------
 # GUI entrypoint
 # -----------------------
+# worker threads never touch widgets: they post events that the Tk thread applies
+# once per GUI_FRAME_MS (20 frames/s)
+GUI_FRAME_MS = 50
+
 def main_gui():
     """
     GUI:
@@ -698,6 +3908,7 @@ def main_gui():
     - persist settings
     """
     cfg = load_config()
+    configure_metrics(cfg)
     root = tk.Tk()
     lang = cfg.get("lang", "en")
     root.title(_( "gui_title", lang))
@@ -733,35 +3944,126 @@ def main_gui():
         save_config(cfg)
         messagebox.showinfo("", _( "settings_saved", lang_var.get()))
 
-    def refresh_mirrors():
-        """Fetch mirrors, test speeds, sort, populate listbox. Auto-select fastest mirror."""
-        label_status.config(text=_( "fetching_mirrors", lang_var.get()))
-        root.update()
-        country = get_country()
+    def render_mirror_list():
+        """Fill the listbox from mirrors/speeds using the current language; select the fastest."""
+        lang_now = lang_var.get()
+        mirror_list.delete(0, tk.END)
+        for i, m in enumerate(mirrors):
+            mirror_list.insert(
+                tk.END,
+                f"{m.url} ({m.protocol}) - " + _( "mirror_speed_label", lang_now).format(
+                    speeds[i] if i < len(speeds) else 0.0
+                ),
+            )
+        if mirrors:
+            mirror_list.select_clear(0, tk.END)
+            mirror_list.select_set(0)
+            mirror_list.see(0)
+
+    # UI event pipeline: (fn, args) pairs posted from any thread, run by pump_events
+    ui_events = queue.Queue()
+
+    def post(fn, *args):
+        """Run fn(*args) on the Tk thread at the next frame (safe from any thread)."""
+        ui_events.put((fn, args))
+
+    def run_event(fn, args):
+        """Run one posted event, logging instead of breaking the pump on errors."""
+        try:
+            fn(*args)
+        except Exception:
+            logging.exception("GUI update failed")
+
+    def pump_events():
+        """
+        Apply the queued UI events on the Tk thread, then reschedule itself. Runs of
+        progress updates collapse to the newest one, so a frame costs one redraw however
+        many segments reported in between.
+        """
+        pending = None
+        with profile_phase("ui"):
+            for _i in range(ui_events.qsize()):
+                try:
+                    fn, args = ui_events.get_nowait()
+                except queue.Empty:
+                    break
+                if fn is show_progress:
+                    pending = args
+                    continue
+                if pending:
+                    run_event(show_progress, pending)
+                    pending = None
+                run_event(fn, args)
+            if pending:
+                run_event(show_progress, pending)
+        root.after(GUI_FRAME_MS, pump_events)
+
+    def set_status(key, *fmt):
+        """Show a translated status line."""
+        label_status.config(text=_( key, lang_var.get()).format(*fmt))
+
+    def show_progress(downloaded, total, speed):
+        """Update progress bar, speed and ETA label."""
+        if speed and speed > 0:
+            speed_mb = speed / (1024 ** 2)
+            remaining = total - downloaded if total and total > downloaded else 0
+            eta_sec = int(remaining / speed) if remaining > 0 else 0
+            eta_str = f"{eta_sec}s" if eta_sec else "-"
+            label_speed.config(text=_( "eta_label", lang_var.get()).format(speed=speed_mb, eta=eta_str))
+        else:
+            label_speed.config(text="")
+        if total and total > 0:
+            # determinate
+            pb.config(mode="determinate", maximum=total)
+            pb['value'] = downloaded
+        else:
+            # indeterminate
+            if pb['mode'] != 'indeterminate':
+                pb.config(mode='indeterminate')
+                pb.start(10)
+
+    def show_country(country):
+        """Show the detected country."""
         country_var.set(country or "")
         label_country.config(text=_( "detected_country", lang_var.get()).format(country or ""))
-        ms = get_mirrors(country)
-        label_status.config(text=_( "mirror_testing", lang_var.get()))
-        root.update()
-        spds = [test_mirror_speed(m["url"]) for m in ms]
-        sorted_pairs = sorted(zip(spds, ms), key=lambda x: x[0], reverse=True)
-        sorted_spds = [s for s, _ in sorted_pairs]
-        sorted_ms = [m for _, m in sorted_pairs]
+
+    def show_ranking(ranked_mirrors, ranked_speeds):
+        """Show the ranking so far; the fastest mirror is usable before slow probes finish."""
         nonlocal mirrors, speeds
-        mirrors, speeds = sorted_ms, sorted_spds
-        mirror_list.delete(0, tk.END)
-        for i, m in enumerate(mirrors):
-            mirror_list.insert(tk.END, f"{m['url']} ({m.get('protocol')}) - " + _( "mirror_speed_label", lang_var.get()).format(speeds[i] if i < len(speeds) else 0.0))
+        mirrors, speeds = ranked_mirrors, ranked_speeds
+        render_mirror_list()
+        if speeds and speeds[0] > 0 and not downloading.is_set():
+            btn_download.config(state="normal")
+
+    def ranking_done():
+        """Final status once every probe has finished or timed out."""
         if not mirrors:
-            label_status.config(text=_( "no_mirrors", lang_var.get()))
+            set_status("no_mirrors")
             btn_download.config(state="disabled")
         else:
-            label_status.config(text=_( "mirror_tested", lang_var.get()).format(len(mirrors)))
-            btn_download.config(state="normal")
-            # auto-select fastest
-            mirror_list.select_clear(0, tk.END)
-            mirror_list.select_set(0)
-            mirror_list.see(0)
+            set_status("mirror_tested", len(mirrors))
+            if not downloading.is_set():
+                btn_download.config(state="normal")
+
+    def refresh_mirrors(prefer):
+        """Fetch mirrors and test speeds concurrently (worker thread); results are posted live."""
+        post(set_status, "fetching_mirrors")
+        country = get_country()
+        post(show_country, country)
+        ms = get_mirrors(country, prefer=prefer)
+        post(set_status, "mirror_testing")
+
+        def on_result(ranked):
+            post(show_ranking, [r["mirror"] for r in ranked], [r["speed"] for r in ranked])
+
+        # budgeted successive halving: only the leading mirrors get the larger probes
+        on_result(rank_mirrors_adaptive(ms, byte_budget=cfg.get("probe_budget", ADAPTIVE_BYTE_BUDGET),
+                                        on_result=on_result, engine=cfg.get("engine", DEFAULT_ENGINE)))
+        post(ranking_done)
+
+    def start_refresh():
+        """Start a mirror refresh in the background; the fastest mirror is auto-selected."""
+        threading.Thread(target=refresh_mirrors, args=(preferred_protocol(verify_var.get()),), daemon=True).start()
 
     def choose_folder():
         """Open directory chooser and store chosen folder."""
@@ -770,43 +4072,26 @@ def main_gui():
             save_folder_var.set(folder)
 
     def start_download():
-        """Start download on selected mirror. Disable controls while downloading."""
+        """
+        Start download on selected mirror. Disable controls while downloading.
+        ISO discovery, size lookup and the disk-space check run on the download thread,
+        so the window never waits on the network and Cancel works from the start.
+        """
         idx = mirror_list.curselection()
         if not idx or idx[0] < 0 or idx[0] >= len(mirrors):
             messagebox.showerror(_( "invalid_choice", lang_var.get()), _( "invalid_choice", lang_var.get()))
             return
-        mirror_url = mirrors[idx[0]]["url"]
-        iso_url = get_latest_iso_url(mirror_url)
-        if not iso_url:
-            messagebox.showerror(_( "iso_not_found", lang_var.get()), _( "iso_not_found", lang_var.get()))
-            return
-        filename = os.path.basename(iso_url)
-        iso_var.set(filename)
         folder = save_folder_var.get()
         if not folder:
             choose_folder()
             folder = save_folder_var.get()
         if not folder:
             return
-        save_path = os.path.join(folder, filename)
-
-        # quick disk space check using content-length header
-        try:
-            # HEAD to check size
-            resp = requests.head(iso_url, timeout=10)
-            resp.raise_for_status()
-            total = int(resp.headers.get("content-length", 0))
-        except Exception:
-            total = 0
-        try:
-            stat = shutil.disk_usage(folder)
-            free_bytes = stat.free
-        except Exception:
-            free_bytes = 0
-        if total and free_bytes and free_bytes < total:
-            free_gb = free_bytes / (1024 ** 3)
-            need_gb = total / (1024 ** 3)
-            messagebox.showwarning("", _( "insufficient_space", lang_var.get()).format(need_gb, free_gb))
+        mirror_url = mirrors[idx[0]].url
+        ranked = list(mirrors)
+        swarm = cfg.get("swarm", DEFAULT_SWARM_MIRRORS)
+        lang_now = lang_var.get()
+        verify = verify_var.get()
 
         # disable controls
         btn_download.config(state="disabled")
@@ -814,53 +4099,24 @@ def main_gui():
         btn_choose_folder.config(state="disabled")
         mirror_list.config(state="disabled")
         lang_menu.config(state="disabled")
-        verify_var.config(state="disabled")
         btn_cancel.config(state="normal")
         btn_pause.config(state="normal")
         downloading.set()
         persist_settings()
+        set_status("preparing")
 
         nonlocal stop_event, download_thread
         stop_event = threading.Event()
 
-        # progress stats for ETA
-        stats = {"last_time": time.time(), "last_bytes": 0, "speed": 0.0}
-
         def progress_cb(downloaded, total, speed):
-            """Update GUI progress bar, speed and ETA label (called from download thread)."""
-            try:
-                # compute speed and ETA nicely
-                now = time.time()
-                if speed and speed > 0:
-                    speed_mb = speed / (1024 ** 2)
-                    remaining = total - downloaded if total and total > downloaded else 0
-                    eta_sec = int(remaining / speed) if speed > 0 and remaining > 0 else 0
-                    eta_str = f"{eta_sec}s" if eta_sec else "-"
-                    label_speed.config(text=_( "eta_label", lang_var.get()).format(speed=speed_mb, eta=eta_str))
-                else:
-                    label_speed.config(text="")
-                if total and total > 0:
-                    # determinate
-                    pb.config(mode="determinate", maximum=total)
-                    pb['value'] = downloaded
-                else:
-                    # indeterminate
-                    if pb['mode'] != 'indeterminate':
-                        pb.config(mode='indeterminate')
-                        pb.start(10)
-            except Exception:
-                logging.exception("progress_cb GUI update failed")
+            post(show_progress, downloaded, total, speed)
 
-        def runner():
-            """Thread runner to call download_iso and handle post-download actions."""
-            ok = download_iso(iso_url, save_path, lang_var.get(), progress_callback=progress_cb, stop_event=stop_event)
+        def finish(ok, verified, save_path):
+            """Restore the controls and show the outcome."""
             # stop indeterminate if needed
-            try:
-                if pb['mode'] == 'indeterminate':
-                    pb.stop()
-                    pb.config(mode='determinate')
-            except Exception:
-                pass
+            if pb['mode'] == 'indeterminate':
+                pb.stop()
+                pb.config(mode='determinate')
 
             # restore UI state
             downloading.clear()
@@ -869,7 +4125,6 @@ def main_gui():
             btn_choose_folder.config(state="normal")
             mirror_list.config(state="normal")
             lang_menu.config(state="readonly")
-            verify_var.config(state="normal")
             btn_cancel.config(state="disabled")
             btn_pause.config(state="disabled")
             btn_pause.config(text=_( "pause", lang_var.get()))
@@ -877,14 +4132,67 @@ def main_gui():
 
             if ok:
                 logging.info("Downloaded: %s from %s", save_path, mirror_url)
-                label_status.config(text=_( "download_complete", lang_var.get()).format(os.path.basename(save_path)))
+                status = _( "download_complete", lang_var.get()).format(os.path.basename(save_path))
+                if verified:
+                    status += "  " + _( "checksum_ok", lang_var.get())
+                label_status.config(text=status)
                 # open folder button enabled
                 btn_open_folder.config(state="normal")
+            elif verified:
+                set_status("checksum_fail")
             else:
                 if stop_event and stop_event.is_set():
                     label_status.config(text="Cancelled")
                 else:
-                    label_status.config(text=_( "download_failed", lang_var.get()))
+                    set_status("download_failed")
+
+        def runner():
+            """
+            Thread runner: find the ISO and its size, check free space, call download_iso,
+            then post the outcome to the Tk thread. stop_event is honoured between steps.
+            """
+            iso_url = get_latest_iso_url(mirror_url)
+            if not iso_url:
+                post(messagebox.showerror, _( "iso_not_found", lang_now), _( "iso_not_found", lang_now))
+                post(finish, False, False, None)
+                return
+            filename = os.path.basename(iso_url)
+            save_path = os.path.join(folder, filename)
+            post(iso_var.set, filename)
+            post(set_status, "downloading", filename)
+            # swarm: the same ISO from the top-ranked mirrors
+            candidates = [mirror_iso_url(m.url, filename) for m in ranked if m.protocol in ("http", "https")]
+            sources = candidates[:swarm]
+
+            # quick disk space check: a resume sidecar already knows the size, otherwise ask the mirror
+            resume = _load_state(save_path)
+            total = resume.get("total", 0) if resume.get("name") == filename and os.path.exists(save_path) else 0
+            if not total and not stop_event.is_set():
+                total = get_remote_info(iso_url)["total"]
+            try:
+                free_bytes = shutil.disk_usage(folder).free
+            except Exception:
+                free_bytes = 0
+            if total and free_bytes and free_bytes < total:
+                free_gb = free_bytes / (1024 ** 3)
+                need_gb = total / (1024 ** 3)
+                post(messagebox.showwarning, "", _( "insufficient_space", lang_now).format(need_gb, free_gb))
+            if stop_event.is_set():
+                post(finish, False, False, save_path)
+                return
+
+            expected = get_expected_sha256(mirror_url, filename) if verify else None
+            verified = []
+            try:
+                ok = download_iso(iso_url, save_path, lang_now, progress_callback=progress_cb, stop_event=stop_event,
+                                  connections=cfg.get("connections", DEFAULT_CONNECTIONS),
+                                  sources=sources if swarm > 1 else None,
+                                  expected_sha256=expected, verify_callback=verified.append,
+                                  engine=cfg.get("engine", DEFAULT_ENGINE), fallbacks=candidates)
+            except Exception:
+                logging.exception("download_iso failed")
+                ok = False
+            post(finish, ok, bool(verified), save_path)
 
         download_thread = threading.Thread(target=runner, daemon=True)
         download_thread.start()
@@ -950,14 +4258,7 @@ def main_gui():
             btn_cancel.config(text=_( "cancel", lang_now))
             btn_pause.config(text=_( "pause", lang_now))
             # re-render mirror list entries using the current language (speed label localized)
-            mirror_list.delete(0, tk.END)
-            for i, m in enumerate(mirrors):
-                mirror_list.insert(
-                    tk.END,
-                    f"{m['url']} ({m.get('protocol')}) - " + _( "mirror_speed_label", lang_now).format(
-                        speeds[i] if i < len(speeds) else 0.0
-                    ),
-                )
+            render_mirror_list()
             # clear status/speed text so they are consistent with new language
             label_speed.config(text="")
             label_status.config(text="")
@@ -988,7 +4289,7 @@ def main_gui():
 
     action_frame = tk.Frame(root, pady=8)
     action_frame.pack(fill="x")
-    btn_refresh = tk.Button(action_frame, text=_( "mirror_testing", lang_var.get()), command=lambda: threading.Thread(target=refresh_mirrors, daemon=True).start())
+    btn_refresh = tk.Button(action_frame, text=_( "mirror_testing", lang_var.get()), command=start_refresh)
     btn_refresh.pack(side="left", padx=5)
     btn_choose_folder = tk.Button(action_frame, text=_( "gui_choose", lang_var.get()), command=choose_folder)
     btn_choose_folder.pack(side="left", padx=5)
@@ -1028,8 +4329,9 @@ def main_gui():
     # apply initial language to all widgets immediately
     update_ui_texts()
 
-    # Start mirror refresh in background
-    threading.Thread(target=refresh_mirrors, daemon=True).start()
+    # Start mirror refresh in background and the UI event pump
+    start_refresh()
+    root.after(GUI_FRAME_MS, pump_events)
     root.mainloop()
 
 # -----------------------
@@ -1039,12 +4341,27 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Arch Linux ISO Downloader")
     parser.add_argument("--cli", action="store_true", help="Run in command-line mode")
     parser.add_argument("--lang", default=None, choices=list(LANGUAGES.keys()), help="Language")
+    parser.add_argument("--connections", type=int, default=None, help="Parallel Range connections per download")
+    parser.add_argument("--swarm", type=int, default=None, help="Download from the top K ranked mirrors at once (1 disables)")
+    parser.add_argument("--engine", default=None, choices=list(ENGINES), help="Concurrency engine for probing and ranged downloads")
+    parser.add_argument("--bench", default=None, choices=list(BENCHMARKS.keys()), help="Run a benchmark and exit")
+    parser.add_argument("--profile", nargs="?", const=PROFILE_REPORT, default=None, metavar="REPORT",
+                        help=f"Record phase times and sampled stacks, written to REPORT (default {PROFILE_REPORT}) at exit")
     args = parser.parse_args()
+    if args.profile:
+        start_profiling(args.profile)
     try:
-        if args.cli:
+        if args.bench:
+            run_benchmark(args.bench)
+        elif args.cli:
             main_cli(args)
         else:
             main_gui()
     except Exception:
         logging.exception("Fatal error")
-        raise
\ No newline at end of file
+        raise
+    finally:
+        if args.profile:
+            report = stop_profiling()
+            if report:
+                print(f"Profile written to {report}")
\ No newline at end of file